@@ -5,14 +5,17 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from import_export import fields, resources
 from import_export.admin import ImportExportModelAdmin
-from import_export.widgets import ForeignKeyWidget
 from django import forms
 from django.contrib import messages
 
 from .models import Client
 from core.decorators import admin_changelist_link
+from core.paginator import EstimatedCountPaginator
+from core.resources import CachedForeignKeyMixin, CachedForeignKeyWidget, StoredDryRunMixin
 
 from commissions.models import ElectricityCommission, GasCommission
+from contracts.models import Contract
+from contracts.recalculation import recalculate_commissions
 
 User = get_user_model()
 
@@ -40,7 +43,7 @@ class ClientAdminForm(forms.ModelForm):
         return cleaned_data
 
 
-class ElectricityCommissionResource(resources.ModelResource):
+class ElectricityCommissionResource(CachedForeignKeyMixin, resources.ModelResource):
     class Meta:
         model = ElectricityCommission
 
@@ -55,11 +58,11 @@ class GasCommissionInline(admin.TabularInline):
     extra = 1
 
 
-class ClientResource(resources.ModelResource):
+class ClientResource(StoredDryRunMixin, CachedForeignKeyMixin, resources.ModelResource):
     account_manager = fields.Field(
         column_name="account_manager",
         attribute="account_manager",
-        widget=ForeignKeyWidget(User, "email"),
+        widget=CachedForeignKeyWidget(User, "email"),
     )
 
     class Meta:
@@ -92,11 +95,19 @@ class ClientResource(resources.ModelResource):
         )
 
 
+@admin.action(description="Recalculate Contract Commissions")
+def recalculate_client_commissions(modeladmin, request, queryset):
+    changed = recalculate_commissions(Contract.objects.filter(client__in=queryset))
+    modeladmin.message_user(request, f"Updated the commission of {changed} contracts.")
+
+
 class ClientAdmin(ImportExportModelAdmin):
     show_full_result_count = False
+    paginator = EstimatedCountPaginator
     form = ClientAdminForm
     resource_class = ClientResource
     inlines = [ElectricityCommissionInline, GasCommissionInline]
+    actions = [recalculate_client_commissions]
     list_display = (
         "id",
         "client",
@@ -182,7 +193,7 @@ class ClientAdmin(ImportExportModelAdmin):
         return form
 
     def save_model(self, request, obj, form, change):
-        if obj.is_lost and not Client.objects.get(id=obj.id).is_lost:
+        if obj.is_lost and not (change and obj.previous_value("is_lost")):
             if form.cleaned_data.get("confirm_export"):
                 obj.export_confirmed = True
                 self.message_user(
@@ -2,7 +2,7 @@ from django.db import models
 from django.urls import reverse
 from simple_history.models import HistoricalRecords
 
-from core.models import TimeStampedModel
+from core.models import FieldTrackerMixin, TimeStampedModel
 from users.models import AccountManager
 
 
@@ -26,12 +26,15 @@ class ClientsManager(models.Manager):
         )
 
 
-class Client(TimeStampedModel):
+class Client(FieldTrackerMixin, TimeStampedModel):
     """
     Represents a client in the system, extending TimeStampedModel to include
     creation and modification timestamps automatically.
     """
 
+    # Compared with their stored values by the signals and the admin.
+    tracked_fields = ("account_manager", "is_lost")
+
     client = models.CharField(verbose_name="Client", max_length=255, unique=True)
     account_manager = models.ForeignKey(
         AccountManager,
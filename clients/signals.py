@@ -8,8 +8,7 @@ from .models import Client
 def update_client_lost_date(sender, instance, **kwargs):
     if instance.pk:
         try:
-            obj = sender.objects.get(pk=instance.pk)
-            if obj.is_lost != instance.is_lost:
+            if instance.has_changed("is_lost"):
                 if instance.is_lost:
                     instance.client_lost_date = timezone.now().date()
                 else:
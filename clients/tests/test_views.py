@@ -0,0 +1,67 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from contracts.models import Contract
+from users.models import AccountManager
+from utilities.models import Supplier, Utility
+
+from ..models import Client
+from ..views import CLIENT_CONTRACT_COLUMNS, AllClientsView, ClientDetailView
+
+
+def create_client(account_manager, number):
+    client = Client.objects.create(client=f"Client {number}", account_manager=account_manager)
+    supplier = Supplier.objects.create(supplier=f"Supplier {number}")
+    utility = Utility.objects.create(utility=f"Utility {number}")
+    for index in range(number):
+        Contract.objects.create(
+            client=client,
+            supplier=supplier,
+            utility=utility,
+            mpan_mpr=f"{number}-{index}",
+            business_name=f"Site {index}",
+        )
+    return client
+
+
+def render_rows(view_class, user, client):
+    """Load a client page's contracts and read every column its table shows."""
+    request = RequestFactory().get("/")
+    request.user = user
+    view = view_class()
+    view.setup(request, pk=client.pk)
+    view.object = view.get_object()
+    context = view.get_context_data(object=view.object)
+    contracts = context.get("contracts", view.object.client_contracts.all())
+    rows = []
+    for contract in contracts:
+        rows.append(
+            [str(getattr(contract, column.split("__")[0])) for column in CLIENT_CONTRACT_COLUMNS]
+        )
+    return rows
+
+
+def count_queries(view_class, user, client):
+    with CaptureQueriesContext(connection) as queries:
+        rows = render_rows(view_class, user, client)
+    return len(queries), rows
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("view_class", [ClientDetailView, AllClientsView])
+def test_client_contracts_load_in_fixed_queries(view_class):
+    account_manager = AccountManager.objects.create(
+        email="manager@example.com", role="ACCOUNT_MANAGER"
+    )
+    small = create_client(account_manager, 1)
+    large = create_client(account_manager, 25)
+
+    small_queries, _rows = count_queries(view_class, account_manager, small)
+    large_queries, rows = count_queries(view_class, account_manager, large)
+
+    assert large_queries == small_queries
+    assert large_queries <= 3
+    assert len(rows) == 25
+    assert {row[6] for row in rows} == {"Supplier 25"}
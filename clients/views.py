@@ -2,6 +2,7 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.mail import BadHeaderError, EmailMessage
+from django.db.models import Prefetch
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import get_template
@@ -11,23 +12,76 @@ from django.views.generic import DetailView, ListView
 
 from contracts.models import Contract
 from core.decorators import account_manager_required
-from core.views import HTMLTitleMixin
+from core.views import HTMLTitleMixin, KeysetPaginationMixin
 
 from .forms import MeterForm, MultipleMeterForm
 from .models import Client
 
+# Contract columns shown by the client contract tables, including the supplier and
+# utility names.
+CLIENT_CONTRACT_COLUMNS = (
+    "client",
+    "contract_type",
+    "contract_status",
+    "client_group",
+    "business_name",
+    "site_address",
+    "supplier__supplier",
+    "utility__utility",
+    "mpan_mpr",
+    "meter_serial_number",
+    "commission_per_annum",
+    "commission_per_unit",
+    "smart_meter",
+    "top_line",
+    "eac",
+    "kva",
+    "day_consumption",
+    "night_consumption",
+    "standing_charge",
+    "sc_frequency",
+    "unit_rate_1",
+    "unit_rate_2",
+    "unit_rate_3",
+    "feed_in_tariff",
+    "is_ooc",
+    "contract_end_date",
+    "vat_rate",
+    "is_directors_approval",
+)
+
+
+def client_contracts():
+    """Returns contracts for the client tables, loading only the columns they show."""
+    return (
+        Contract.objects.select_related(None)
+        .select_related("supplier", "utility")
+        .only(*CLIENT_CONTRACT_COLUMNS)
+    )
+
 
 @method_decorator([account_manager_required, never_cache], name="dispatch")
-class ClientDetailView(LoginRequiredMixin, HTMLTitleMixin, DetailView):
-    """Details all contracts for that client by account manager"""
+class ClientDetailView(LoginRequiredMixin, HTMLTitleMixin, KeysetPaginationMixin, DetailView):
+    """Details the contracts for that client by account manager, a page at a time"""
 
     model = Client
     template_name = "clients/contracts/client_detail.html"
     login_url = "/users/login/"
+    page_size = 500
 
     def get_html_title(self):
         return self.object.client
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = self.paginate_keyset(client_contracts().filter(client=self.object))
+        for contract in page:
+            # As prefetch_related would, point every row at the client already loaded.
+            contract.client = self.object
+        context["page_obj"] = page
+        context["contracts"] = page.object_list
+        return context
+
     def get_queryset(self):
         if self.request.user.is_authenticated:
             return Client.objects.filter(account_manager=self.request.user)
@@ -66,7 +120,9 @@ class ClientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
 
 class AllClientsView(LoginRequiredMixin, UserPassesTestMixin, HTMLTitleMixin, DetailView):
-    queryset = Client.objects.all()
+    queryset = Client.objects.prefetch_related(
+        Prefetch("client_contracts", queryset=client_contracts())
+    )
     template_name = "clients/contracts/all_contracts/all_client_contracts.html"
     login_url = "/users/login/"
 
@@ -0,0 +1,131 @@
+from bisect import bisect_left
+
+from django.db.models import Exists
+
+from utilities.models import Utility
+
+from .models import ElectricityCommission, GasCommission
+
+# Commission models by the utility name their bands apply to.
+COMMISSION_MODELS = {"Electricity": ElectricityCommission, "Gas": GasCommission}
+
+
+class BandIndex:
+    """
+    The commission bands of one client and utility, searchable by EAC with a bisection.
+
+    Bands are inclusive at both ends and may overlap, in which case the band with the
+    lowest primary key wins, as it does for ``filter(...).first()``. To keep lookups
+    logarithmic the bands are flattened into the sorted band boundaries plus the
+    winning rates at each boundary and in each gap between two boundaries.
+    """
+
+    def __init__(self, bands):
+        """
+        Args:
+            bands: An iterable of (pk, eac_from, eac_to, commission_per_annum,
+                commission_per_unit) tuples.
+        """
+        bands = sorted(bands)
+        self.boundaries = sorted({band[1] for band in bands} | {band[2] for band in bands})
+        self.at_boundary = [self._winner(bands, value, value) for value in self.boundaries]
+        self.between = [
+            self._winner(bands, low, high)
+            for low, high in zip(self.boundaries, self.boundaries[1:])
+        ]
+
+    @staticmethod
+    def _winner(bands, low, high):
+        # Every band covering one point strictly between two adjacent boundaries covers
+        # the whole gap, so checking the gap's ends is enough.
+        for _pk, eac_from, eac_to, commission_per_annum, commission_per_unit in bands:
+            if eac_from <= low and high <= eac_to:
+                return commission_per_annum, commission_per_unit
+        return None
+
+    def lookup(self, eac):
+        """Returns the (commission_per_annum, commission_per_unit) for an EAC, or None."""
+        if eac is None:
+            return None
+        index = bisect_left(self.boundaries, eac)
+        if index < len(self.boundaries) and self.boundaries[index] == eac:
+            return self.at_boundary[index]
+        if 0 < index < len(self.boundaries):
+            return self.between[index - 1]
+        return None
+
+
+class CommissionBandIndex:
+    """Band indexes for a set of clients, keyed by utility name and client id."""
+
+    def __init__(self, bands=None):
+        self.indexes = {}
+        for key, client_bands in (bands or {}).items():
+            self.indexes[key] = BandIndex(client_bands)
+
+    @classmethod
+    def load(cls, client_ids=None):
+        """
+        Load the bands of the given clients (all clients when None) with one query per
+        commission model.
+        """
+        bands = {}
+        for utility, model in COMMISSION_MODELS.items():
+            queryset = model.objects.all()
+            if client_ids is not None:
+                queryset = queryset.filter(client_id__in=client_ids)
+            rows = queryset.values_list(
+                "client_id",
+                "pk",
+                "eac_from",
+                "eac_to",
+                "commission_per_annum",
+                "commission_per_unit",
+            )
+            for client_id, *band in rows:
+                bands.setdefault((utility, client_id), []).append(tuple(band))
+        return cls(bands)
+
+    def lookup(self, utility, client_id, eac):
+        """Returns the (commission_per_annum, commission_per_unit) for a contract, or None."""
+        index = self.indexes.get((utility, client_id))
+        return index.lookup(eac) if index else None
+
+    def apply(self, contract, utility=None):
+        """
+        Set the commission rates of a contract from its matching band.
+
+        Contracts without a matching band keep their current rates.
+        """
+        if utility is None:
+            utility = contract.utility.utility
+        rates = self.lookup(utility, contract.client_id, contract.eac)
+        if rates:
+            contract.commission_per_annum, contract.commission_per_unit = rates
+
+
+def matching_band_rates(client_id, utility_id, eac, utility=None):
+    """
+    Returns the (commission_per_annum, commission_per_unit) of the band of a client
+    covering an EAC, or None, with a single query and without building an index.
+
+    The band is looked up by the utility's id, so its name need not be loaded unless
+    given. Overlapping bands resolve to the lowest primary key, as in BandIndex.
+    """
+    if eac is None or utility_id is None:
+        return None
+    queries = []
+    for name, model in COMMISSION_MODELS.items():
+        if utility is not None and name != utility:
+            continue
+        queryset = model.objects.filter(client_id=client_id, eac_from__lte=eac, eac_to__gte=eac)
+        if utility is None:
+            queryset = queryset.filter(Exists(Utility.objects.filter(pk=utility_id, utility=name)))
+        queries.append(
+            queryset.order_by("pk").values_list("commission_per_annum", "commission_per_unit")[:1]
+        )
+    if not queries:
+        return None
+    # Only the query of the contract's utility can return a row.
+    rows = list(queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0])
+    return rows[0] if rows else None
@@ -0,0 +1,108 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+
+from clients.models import Client
+from contracts.models import Contract
+from users.models import AccountManager
+from utilities.models import Supplier, Utility
+from ..bands import BandIndex, matching_band_rates
+from ..models import ElectricityCommission, GasCommission
+
+
+@pytest.fixture
+def client():
+    account_manager = AccountManager.objects.create(email="bands@example.com")
+    return Client.objects.create(client="Bands Client", account_manager=account_manager)
+
+
+@pytest.fixture
+def gas_band(client):
+    return GasCommission.objects.create(
+        client=client,
+        eac_from=Decimal("0.00"),
+        eac_to=Decimal("10000.00"),
+        commission_per_annum=Decimal("100.000"),
+        commission_per_unit=Decimal("0.010"),
+    )
+
+
+def test_band_index_lookup():
+    index = BandIndex(
+        [
+            (1, Decimal("0"), Decimal("1000"), Decimal("10"), Decimal("0.1")),
+            (2, Decimal("2000"), Decimal("3000"), Decimal("20"), Decimal("0.2")),
+            # Overlaps the first band, which wins because of its lower primary key.
+            (3, Decimal("500"), Decimal("1500"), Decimal("30"), Decimal("0.3")),
+        ]
+    )
+    assert index.lookup(Decimal("0")) == (Decimal("10"), Decimal("0.1"))
+    assert index.lookup(Decimal("1000")) == (Decimal("10"), Decimal("0.1"))
+    assert index.lookup(Decimal("1000.01")) == (Decimal("30"), Decimal("0.3"))
+    assert index.lookup(Decimal("1500")) == (Decimal("30"), Decimal("0.3"))
+    assert index.lookup(Decimal("1750")) is None
+    assert index.lookup(Decimal("3000")) == (Decimal("20"), Decimal("0.2"))
+    assert index.lookup(Decimal("3000.01")) is None
+    assert index.lookup(Decimal("-1")) is None
+    assert index.lookup(None) is None
+
+
+@pytest.mark.django_db
+def test_matching_band_rates(client, gas_band, django_assert_num_queries):
+    gas = Utility.objects.create(utility="Gas")
+    GasCommission.objects.create(
+        client=client,
+        eac_from=Decimal("400.00"),
+        eac_to=Decimal("600.00"),
+        commission_per_annum=Decimal("200.000"),
+        commission_per_unit=Decimal("0.020"),
+    )
+    expected = (Decimal("100.000"), Decimal("0.010"))
+    with django_assert_num_queries(1):
+        assert matching_band_rates(client.pk, gas.pk, Decimal("500")) == expected
+    with django_assert_num_queries(1):
+        assert matching_band_rates(client.pk, gas.pk, Decimal("500"), utility="Gas") == expected
+    electricity = Utility.objects.create(utility="Electricity")
+    assert matching_band_rates(client.pk, electricity.pk, Decimal("500")) is None
+    assert matching_band_rates(client.pk, gas.pk, Decimal("20000")) is None
+    with django_assert_num_queries(0):
+        assert matching_band_rates(client.pk, gas.pk, None) is None
+
+
+@pytest.mark.django_db
+def test_contract_save_uses_current_bands(client, gas_band):
+    contract = Contract.objects.create(
+        client=client,
+        supplier=Supplier.objects.create(supplier="Bands Supplier"),
+        utility=Utility.objects.create(utility="Gas"),
+        mpan_mpr="1",
+        business_name="Site 1",
+        eac=Decimal("500.00"),
+        contract_end_date=date(2026, 1, 1),
+    )
+    assert contract.commission_per_annum == Decimal("100.000")
+
+    # Bands are not cached, so edits apply to the next save.
+    gas_band.commission_per_annum = Decimal("150.000")
+    gas_band.save()
+    ElectricityCommission.objects.create(
+        client=client,
+        eac_from=Decimal("0.00"),
+        eac_to=Decimal("10000.00"),
+        commission_per_annum=Decimal("999.00"),
+        commission_per_unit=Decimal("0.999"),
+    )
+    contract = Contract.objects.get(pk=contract.pk)
+    contract.save()
+    assert contract.commission_per_annum == Decimal("150.000")
+
+    # The utility is not loaded to find the band.
+    contract = Contract._base_manager.get(pk=contract.pk)
+    contract.save()
+    assert not Contract._meta.get_field("utility").is_cached(contract)
+    assert contract.commission_per_annum == Decimal("150.000")
+
+    # Contracts without an EAC keep their rates instead of failing to save.
+    contract.eac = None
+    contract.save()
+    assert contract.commission_per_annum == Decimal("150.000")
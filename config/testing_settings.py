@@ -1,6 +1,17 @@
+import tempfile
+
 from .settings import *  # noqa
 
 
 # Make sure that tests are never sending real emails.
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 SILENCED_SYSTEM_CHECKS = ["django_recaptcha.recaptcha_test_key_error"]
+
+# Keep files written by tests out of the project directory.
+MEDIA_ROOT = tempfile.mkdtemp(prefix="ep_crm_test_media_")
+
+# The manifest storage needs collectstatic, which tests rendering error pages don't run.
+STORAGES = {
+    **STORAGES,  # noqa: F405
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
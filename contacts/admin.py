@@ -1,9 +1,9 @@
 from django.contrib import admin
 from .models import JobTitle, Contact
 from clients.models import Client
+from core.resources import CachedForeignKeyMixin, CachedForeignKeyWidget
 from import_export import fields, resources
 from import_export.admin import ImportExportModelAdmin
-from import_export.widgets import ForeignKeyWidget
 
 
 class ContactInline(admin.TabularInline):
@@ -18,17 +18,17 @@ class JobTitleAdmin(admin.ModelAdmin):
 admin.site.register(JobTitle, JobTitleAdmin)
 
 
-class ContactResource(resources.ModelResource):
+class ContactResource(CachedForeignKeyMixin, resources.ModelResource):
     Client = fields.Field(
         column_name="client",
         attribute="client",
-        widget=ForeignKeyWidget(Client, "client"),
+        widget=CachedForeignKeyWidget(Client, "client"),
     )
 
     JobTitle = fields.Field(
         column_name="job_title",
         attribute="job_title",
-        widget=ForeignKeyWidget(JobTitle, "title"),
+        widget=CachedForeignKeyWidget(JobTitle, "title"),
     )
 
     class Meta:
@@ -1,6 +1,12 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from import_export.admin import ImportExportModelAdmin, ExportActionMixin
-from .models import Contract
+from core.paginator import EstimatedCountPaginator
+from .models import Contract, ExportJob
 from .filters import (
     ClientFilter,
     SupplierFilter,
@@ -22,11 +28,11 @@ from .admin_actions import (
     make_contract_locked,
     contracts_removed,
     contracts_lost,
+    recalculate_contract_commissions,
     bulk_quote_template,
     export_commissions_to_excel,
     export_expired_contracts,
-    export_corona_live_duplicates,
-    export_sse_live_duplicates,
+    export_live_duplicates,
     export_to_excel_and_pdfs,
 )
 from .custom_search import CustomSearchAdmin
@@ -36,6 +42,7 @@ from .resources import ContractResource
 class ContractAdmin(ImportExportModelAdmin, ExportActionMixin, CustomSearchAdmin):
     list_per_page = 20
     show_full_result_count = False
+    paginator = EstimatedCountPaginator
     resource_class = ContractResource
     ordering = ("contract_end_date",)
     readonly_fields = ("commission_per_annum", "commission_per_unit")
@@ -233,13 +240,78 @@ class ContractAdmin(ImportExportModelAdmin, ExportActionMixin, CustomSearchAdmin
         make_contract_locked,
         contracts_lost,
         contracts_removed,
+        recalculate_contract_commissions,
         bulk_quote_template,
         export_commissions_to_excel,
         export_expired_contracts,
-        export_corona_live_duplicates,
-        export_sse_live_duplicates,
+        export_live_duplicates,
         export_to_excel_and_pdfs,
     ]
 
 
 admin.site.register(Contract, ContractAdmin)
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "kind",
+        "status",
+        "requested_by",
+        "created_at",
+        "finished_at",
+        "download_link",
+    )
+    list_filter = ("kind", "status")
+    list_select_related = ("requested_by",)
+    readonly_fields = (
+        "kind",
+        "status",
+        "requested_by",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "download_link",
+        "error",
+    )
+    exclude = ("contract_ids", "file")
+    ordering = ("-created_at",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Exports can hold commission data, so users only see the jobs they queued.
+        if not request.user.is_superuser:
+            queryset = queryset.filter(requested_by=request.user)
+        return queryset
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:job_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="contracts_exportjob_download",
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, job_id):
+        job = get_object_or_404(self.get_queryset(request), pk=job_id)
+        if not self.has_view_permission(request, job):
+            raise PermissionDenied
+        if job.status != ExportJob.Status.DONE or not job.file:
+            raise Http404("The export is not ready.")
+        return FileResponse(
+            job.file.open("rb"), as_attachment=True, filename=job.file.name.rsplit("/", 1)[-1]
+        )
+
+    @admin.display(description="Download")
+    def download_link(self, obj):
+        if obj.status != ExportJob.Status.DONE or not obj.file:
+            return "-"
+        link = reverse("admin:contracts_exportjob_download", args=[obj.pk])
+        return format_html('<a href="{}">Download</a>', link)
+
+
+admin.site.register(ExportJob, ExportJobAdmin)
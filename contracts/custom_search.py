@@ -1,24 +1,162 @@
+import re
+
 from django.contrib import admin
+from django.contrib.admin.utils import lookup_spawns_duplicates
+from django.contrib.postgres.search import SearchQuery
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import CONTRACT_SEARCH_VECTOR, normalise_mpan
+
+# Whole numbers at least this long are taken for an MPAN, MPR or serial number and only
+# matched against the meter identifiers.
+METER_NUMBER_MIN_LENGTH = 6
+# Separators of a pasted list of MPANs. Whitespace inside an entry is dropped, since
+# MPANs are often written in groups of digits.
+MPAN_LIST_SEPARATORS = re.compile(r"[,;\r\n]+")
+# Lists longer than this are matched against one array parameter instead of one
+# parameter per MPAN.
+MPAN_ARRAY_THRESHOLD = 500
+# Related names matching more rows than this are filtered with a subquery rather than
+# with the list of their ids.
+RELATED_IDS_LIMIT = 1000
+
+
+def parse_mpan_list(search_term):
+    """
+    Returns the normalised MPANs of a pasted list, or None when the search is not one.
+
+    Lists are separated by commas, semicolons or new lines. Spaces only separate a list
+    when every entry is a whole number long enough to be a meter number, which is how
+    browsers flatten a column pasted into the search box.
+    """
+    if MPAN_LIST_SEPARATORS.search(search_term):
+        entries = MPAN_LIST_SEPARATORS.split(search_term)
+    else:
+        entries = search_term.split()
+        if len(entries) < 2 or not all(
+            entry.isdigit() and len(entry) >= METER_NUMBER_MIN_LENGTH for entry in entries
+        ):
+            return None
+    return sorted({normalise_mpan(entry) for entry in entries} - {""})
+
+
+def filter_mpans(queryset, mpan_keys):
+    """Filter contracts by a list of normalised MPANs with a single lookup on mpan_key."""
+    if len(mpan_keys) > MPAN_ARRAY_THRESHOLD:
+        return queryset.filter(
+            mpan_key__in=RawSQL("SELECT UNNEST(%s::varchar[])", (list(mpan_keys),))
+        )
+    return queryset.filter(mpan_key__in=mpan_keys)
 
 
 class CustomSearchAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin searching contracts through their indexes.
+
+    search_fields decides what is searched. Of those fields, the columns of
+    CONTRACT_SEARCH_VECTOR are matched by word prefix through its full text index when
+    all of them are listed, meter identifiers by case insensitive prefix, and names of
+    related models (``relation__column``) are resolved to ids before filtering the
+    contracts. Other fields are matched the way ModelAdmin matches them.
+    """
+
+    # Columns of CONTRACT_SEARCH_VECTOR, whose index only serves a search of all of them.
+    search_vector_fields = tuple(
+        expression.name for expression in CONTRACT_SEARCH_VECTOR.get_source_expressions()
+    )
+    # Columns with an index on their upper case value, searched by prefix.
+    prefix_search_fields = ("mpan_mpr", "meter_serial_number")
+
     def get_search_results(self, request, queryset, search_term):
         """
-        Enhances filtering by allowing searches for multiple MPAN numbers separated by commas,
-        and maintains compatibility with other applied filters.
+        Enhances filtering by allowing searches for lists of MPAN numbers, and maintains
+        compatibility with other applied filters.
+
+        Searches of the indexed fields never join or scan the whole contract table.
         """
-        use_distinct = False
-        # Check if the search_term involves potential multiple MPAN numbers
-        if "," in search_term:
-            mpan_terms = [term.strip() for term in search_term.split(",") if term.strip()]
-            if mpan_terms:
-                q_objects = Q(mpan_mpr__iexact=mpan_terms[0])  # Start with the first term
-                for term in mpan_terms[1:]:
-                    q_objects |= Q(mpan_mpr__iexact=term)  # Use |= to add each subsequent term
-                queryset = queryset.filter(q_objects).distinct()
-                use_distinct = True
-        else:
-            # Handle single mpan_mpr or other search fields via superclass method
-            queryset, use_distinct = super().get_search_results(request, queryset, search_term)
-        return queryset, use_distinct
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+
+        mpan_keys = parse_mpan_list(search_term) if "mpan_mpr" in search_fields else None
+        if mpan_keys is not None:
+            if mpan_keys:
+                queryset = filter_mpans(queryset, mpan_keys)
+            return queryset, False
+
+        use_vector = set(self.search_vector_fields) <= set(search_fields)
+        if use_vector:
+            queryset = queryset.alias(search_document=CONTRACT_SEARCH_VECTOR)
+        other_fields = [
+            field
+            for field in search_fields
+            if field not in self.prefix_search_fields
+            and not (use_vector and field in self.search_vector_fields)
+        ]
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = queryset.filter(
+                self.search_term_filter(bit, search_fields, use_vector, other_fields)
+            )
+        may_have_duplicates = any(
+            lookup_spawns_duplicates(self.opts, self.construct_search(field))
+            for field in other_fields
+            if not self.get_related_search_field(field)
+        )
+        return queryset, may_have_duplicates
+
+    def get_related_search_field(self, field_name):
+        """Returns the foreign key of a ``relation__column`` search field, or None."""
+        name, _separator, column = field_name.partition("__")
+        if not column or "__" in column:
+            return None
+        try:
+            field = self.opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        return field if field.many_to_one else None
+
+    @staticmethod
+    def construct_search(field_name):
+        """Returns the lookup of a search field, with the prefixes ModelAdmin accepts."""
+        lookups = {"^": "istartswith", "=": "iexact", "@": "search"}
+        if field_name[:1] in lookups:
+            return f"{field_name[1:]}__{lookups[field_name[0]]}"
+        return f"{field_name}__icontains"
+
+    def search_term_filter(self, term, search_fields, use_vector, other_fields):
+        """Returns the condition matching the contracts for one word of the search."""
+        condition = Q()
+        prefix_fields = [field for field in self.prefix_search_fields if field in search_fields]
+        for field in prefix_fields:
+            condition |= Q(**{f"{field}__istartswith": term})
+        if prefix_fields and term.isdigit() and len(term) >= METER_NUMBER_MIN_LENGTH:
+            return condition
+
+        words = re.findall(r"\w+", term)
+        if use_vector and words:
+            condition |= Q(
+                search_document=SearchQuery(
+                    " & ".join(f"{word}:*" for word in words), search_type="raw", config="simple"
+                )
+            )
+        for field_name in other_fields:
+            field = self.get_related_search_field(field_name)
+            if field is None:
+                condition |= Q(**{self.construct_search(field_name): term})
+                continue
+            column = field_name.partition("__")[2]
+            matches = field.related_model._base_manager.filter(
+                **{f"{column}__icontains": term}
+            ).values_list("pk", flat=True)
+            ids = list(matches[: RELATED_IDS_LIMIT + 1])
+            if len(ids) > RELATED_IDS_LIMIT:
+                condition |= Q(**{f"{field.name}__in": matches})
+            elif ids:
+                condition |= Q(**{f"{field.name}__in": ids})
+        # An empty condition would match every contract.
+        return condition or Q(pk__in=[])
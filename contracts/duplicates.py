@@ -0,0 +1,79 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Contract
+
+# Columns that identify the same supply contract entered more than once.
+DEFAULT_KEY_FIELDS = ("supplier", "business_name", "mpan_mpr", "contract_end_date")
+DEFAULT_STATUSES = (Contract.ContractStatus.LIVE,)
+
+# Placeholder MPAN used for sites whose meter number is not known yet.
+PLACEHOLDER_MPAN = "11111"
+
+
+def find_duplicates(
+    contracts=None,
+    suppliers=None,
+    statuses=DEFAULT_STATUSES,
+    key_fields=DEFAULT_KEY_FIELDS,
+):
+    """
+    Returns the contracts that repeat an earlier contract with the same key columns.
+
+    Rows are numbered by id inside each group of equal key columns with a single
+    window query; every row after the first of its group is a duplicate.
+
+    Args:
+        contracts: Optional queryset restricting the scan to the MPANs it contains.
+        suppliers: Optional supplier names to restrict the scan to.
+        statuses: Contract statuses taking part in the scan, None for all.
+        key_fields: The columns two contracts must share to be duplicates.
+    """
+    queryset = Contract.objects.exclude(mpan_mpr=PLACEHOLDER_MPAN)
+    if contracts is not None:
+        queryset = queryset.filter(mpan_mpr__in=contracts.order_by().values("mpan_mpr"))
+    if suppliers:
+        queryset = queryset.filter(supplier__supplier__in=suppliers)
+    if statuses:
+        queryset = queryset.filter(contract_status__in=statuses)
+    return (
+        queryset.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F(field) for field in key_fields],
+                order_by=F("id").asc(),
+            )
+        )
+        .filter(row_number__gt=1)
+        .order_by("client__client", "mpan_mpr", "id")
+    )
+
+
+def scan_duplicates(batch_size=5000, **options):
+    """
+    Yield the duplicates of the whole contract table, a range of MPANs at a time.
+
+    Every window query covers at most batch_size MPANs and walks the
+    (mpan_mpr, contract_end_date, contract_status) index, so the scan never has to
+    sort the whole table at once. The key fields must include mpan_mpr so that no
+    group of duplicates spans two ranges.
+    """
+    key_fields = options.get("key_fields", DEFAULT_KEY_FIELDS)
+    if "mpan_mpr" not in key_fields:
+        raise ValueError("An incremental scan needs mpan_mpr among the key fields.")
+
+    mpans = (
+        Contract.objects.exclude(mpan_mpr=PLACEHOLDER_MPAN)
+        .order_by("mpan_mpr")
+        .values_list("mpan_mpr", flat=True)
+        .distinct()
+    )
+    last_mpan = None
+    while True:
+        batch = mpans if last_mpan is None else mpans.filter(mpan_mpr__gt=last_mpan)
+        bounds = list(batch[:batch_size])
+        if not bounds:
+            return
+        ranged = Contract.objects.filter(mpan_mpr__gte=bounds[0], mpan_mpr__lte=bounds[-1])
+        yield from find_duplicates(ranged, **options)
+        last_mpan = bounds[-1]
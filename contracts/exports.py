@@ -0,0 +1,315 @@
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Sum
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .importer import batched
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows fetched from the database per round trip while exporting.
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iterate(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterate a queryset with a server-side cursor instead of caching every row."""
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def write_xlsx(file, title, headers, rows, bold_headers=False):
+    """
+    Write rows to a single sheet workbook in openpyxl's write-only mode.
+
+    Write-only worksheets serialise each row as it is appended, so memory use does
+    not grow with the number of rows.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title)
+    if bold_headers:
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(worksheet, value=header)
+            cell.font = Font(bold=True)
+            header_cells.append(cell)
+        worksheet.append(header_cells)
+    else:
+        worksheet.append(headers)
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(file)
+
+
+def xlsx_response(filename, title, headers, rows, bold_headers=False):
+    """
+    Returns a streaming download of a workbook built from an iterable of rows.
+
+    The workbook is spooled to a temporary file, which FileResponse then streams
+    back in blocks and closes, so neither the rows nor the finished file are held in
+    the worker's memory.
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        write_xlsx(file, title, headers, rows, bold_headers)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+# Client commissions -----------------------------------------------------------------
+
+COMMISSIONS_FILENAME = "contract_commissions_by_client.xlsx"
+COMMISSIONS_TITLE = "Commissions by Client Contracts"
+COMMISSION_COLUMNS = [
+    "Client",
+    "Contract Status",
+    "Contract Type",
+    "Originator",
+    "Client Onboarded",
+    "Supplier",
+    "Utility",
+    "MPAN/MPR",
+    "Commission per Unit Rate",
+    "Commission per Annum Rate",
+    "Total EAC",
+    "Number of Contracts",
+    "Total Value per Contract",
+]
+
+
+def commission_rows(queryset):
+    """Yield the commission export rows of a selection of contracts."""
+    selected_contracts = (
+        queryset.values(
+            "client__client",
+            "contract_status",
+            "contract_type",
+            "client__originator",
+            "client__client_onboarded",
+            "supplier__supplier",
+            "utility__utility",
+            "mpan_mpr",
+            "commission_per_unit",
+            "commission_per_annum",
+        )
+        .annotate(
+            total_eac=Sum("eac"),
+            count=Count("id"),
+            total_value_per_contract=ExpressionWrapper(
+                F("total_eac") * F("commission_per_unit"),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by("client__client", "utility__utility")
+    )
+    for contract in iterate(selected_contracts):
+        yield [
+            contract["client__client"],
+            contract["contract_status"],
+            contract["contract_type"],
+            contract["client__originator"],
+            contract["client__client_onboarded"],
+            contract["supplier__supplier"],
+            contract["utility__utility"],
+            contract["mpan_mpr"],
+            contract["commission_per_unit"],
+            contract["commission_per_annum"],
+            contract["total_eac"],
+            contract["count"],
+            contract["total_value_per_contract"],
+        ]
+
+
+def write_commissions(queryset, file):
+    write_xlsx(file, COMMISSIONS_TITLE, COMMISSION_COLUMNS, commission_rows(queryset))
+
+
+# Excel and individual PDFs -----------------------------------------------------------
+
+EXCEL_AND_PDFS_FILENAME = "exported_data.zip"
+EXPORT_FIELDS = ["supplier", "client", "mpan_mpr", "business_name", "site_address"]
+
+
+def get_field_value(obj, field):
+    """Helper function to get string values from objects, including related objects"""
+    value = getattr(obj, field)
+    if field in ["supplier", "client"]:
+        return str(value) if value else ""
+    elif isinstance(value, bool):
+        return "Yes" if value else "No"
+    elif value is None:
+        return ""
+    return str(value)
+
+
+# Built once per process and shared by every PDF rendered in it.
+PDF_STYLES = getSampleStyleSheet()
+PDF_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+        ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
+        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 5),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+)
+
+# Selections up to this size are rendered in process, where starting a pool costs
+# more than it saves.
+PARALLEL_PDF_THRESHOLD = 50
+# Contracts handed to the process pool at a time, bounding the PDFs held in memory.
+PDF_BATCH_SIZE = 200
+
+
+def create_pdf(data, current_date=None):
+    """Create a PDF for a single row of data and return its bytes"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, topMargin=50, bottomMargin=50, leftMargin=50, rightMargin=50
+    )
+
+    elements = []
+
+    # Add title
+    elements.append(Paragraph("Data Export Report", PDF_STYLES["Title"]))
+    elements.append(Spacer(1, 20))
+
+    # Add date
+    if current_date is None:
+        current_date = timezone.now().strftime("%Y-%m-%d")
+    elements.append(Paragraph(f"Date: {current_date}", PDF_STYLES["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # Create table with field names and values
+    table_data = [[field, data[field]] for field in EXPORT_FIELDS]
+    table = Table(table_data, colWidths=[200, 300])
+    table.setStyle(PDF_TABLE_STYLE)
+    elements.append(table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_pdf(args):
+    """Process pool entry point for create_pdf."""
+    return create_pdf(*args)
+
+
+def render_pdfs(rows, current_date, workers=None):
+    """
+    Yield the PDF of every row, in order.
+
+    Large selections are rendered in a process pool, a batch at a time, so rendering
+    uses every core while only one batch of finished PDFs is held in memory.
+    """
+    if len(rows) <= PARALLEL_PDF_THRESHOLD or workers == 1:
+        for data in rows:
+            yield create_pdf(data, current_date)
+        return
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batched(rows, PDF_BATCH_SIZE):
+            yield from pool.map(
+                render_pdf,
+                [(data, current_date) for data in batch],
+                chunksize=max(1, len(batch) // (workers * 4)),
+            )
+
+
+def excel_and_pdf_members(queryset, workers=None):
+    """
+    Yield the (name, content) members of the Excel and PDFs archive.
+
+    The queryset is evaluated once into plain rows, which feed both the sheet and
+    the PDF renderer. Each PDF is yielded as soon as it is rendered.
+    """
+    rows = [
+        {field: get_field_value(obj, field) for field in EXPORT_FIELDS} for obj in iterate(queryset)
+    ]
+
+    # Excel export
+    excel_buffer = io.BytesIO()
+    write_xlsx(
+        excel_buffer,
+        "Exported Data",
+        EXPORT_FIELDS,
+        ([data[field] for field in EXPORT_FIELDS] for data in rows),
+    )
+    yield "exported_data.xlsx", excel_buffer.getvalue()
+
+    # Individual PDFs for each row
+    current_date = timezone.now().strftime("%Y-%m-%d")
+    for index, pdf in enumerate(render_pdfs(rows, current_date, workers)):
+        yield f"data_{index + 1}.pdf", pdf
+
+
+def write_excel_and_pdfs(queryset, file, workers=None):
+    """Write a zip of an Excel sheet of the contracts plus one PDF per contract to a file."""
+    with zipfile.ZipFile(file, "w") as zf:
+        for name, content in excel_and_pdf_members(queryset, workers):
+            zf.writestr(name, content)
+
+
+# Streaming archives -------------------------------------------------------------------
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    Unseekable sink that collects what ZipFile writes until it is drained.
+
+    ZipFile falls back to data descriptors on unseekable files, so each member is
+    written once, front to back, and can be sent on as soon as it is complete.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(members):
+    """
+    Yield a zip archive of (name, content) members piece by piece.
+
+    Only the member being added is held in memory; the central directory follows
+    once every member has been sent.
+    """
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, content in members:
+            zf.writestr(name, content)
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def zip_response(filename, members):
+    """Returns a streaming download of a zip archive of (name, content) members."""
+    response = StreamingHttpResponse(stream_zip(members), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 from .models import Contract
 from users.models import AccountManager
+from users.utils import account_manager_choices
 
 
 class ClientFilter(AutocompleteFilter):
@@ -36,15 +37,18 @@ class AccountManagerFilter(admin.SimpleListFilter):
     parameter_name = "account_manager"
 
     def lookups(self, request, model_admin):
-        # Return a list of tuples (value, verbose_name) for the filter options
-        account_managers = AccountManager.objects.all()
-        return [(manager.email, manager.email) for manager in account_managers]
+        # (id, email) pairs of the current account managers
+        return account_manager_choices()
 
     def queryset(self, request, queryset):
-        # Filter the queryset based on the selected account manager's email
-        if self.value():
-            return queryset.filter(client__account_manager__email=self.value())
-        return queryset
+        # Filter the queryset on the client's account manager id, without joining users
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            # Links saved before the filter used ids carry the account manager's email.
+            value = AccountManager.objects.filter(email=value).values_list("pk", flat=True).first()
+        return queryset.filter(client__account_manager_id=value)
 
 
 class MultiStatusFilter(admin.SimpleListFilter):
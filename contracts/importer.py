@@ -0,0 +1,395 @@
+import csv
+import hashlib
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from clients.models import Client
+from commissions.bands import CommissionBandIndex
+from utilities.models import Supplier, Utility
+
+from .models import Contract
+from .stats import rebuild_contract_stats
+
+User = get_user_model()
+
+# Column order of the supplier contract sheets.
+IMPORT_ORDER = [
+    "id",
+    "contract_type",
+    "seamless_updated",
+    "contract_status",
+    "dwellent_id",
+    "bid_id",
+    "portal_status",
+    "client",
+    "client_group",
+    "seed_stock",
+    "client_manager",
+    "is_directors_approval",
+    "directors_approval_date",
+    "business_name",
+    "company_reg_number",
+    "utility",
+    "top_line",
+    "mpan_mpr",
+    "meter_serial_number",
+    "meter_onboarded",
+    "meter_status",
+    "building_name",
+    "site_address",
+    "billing_address",
+    "supplier",
+    "supplier_coding",
+    "contract_start_date",
+    "contract_end_date",
+    "lock_in_date",
+    "supplier_start_date",
+    "account_number",
+    "eac",
+    "day_consumption",
+    "night_consumption",
+    "vat_rate",
+    "contract_value",
+    "standing_charge",
+    "sc_frequency",
+    "unit_rate_1",
+    "unit_rate_2",
+    "unit_rate_3",
+    "feed_in_tariff",
+    "seamless_status",
+    "profile",
+    "is_ooc",
+    "service_type",
+    "pence_per_kilowatt",
+    "day_kilowatt_hour_rate",
+    "night_rate",
+    "annualised_budget",
+    "commission_per_annum",
+    "commission_per_unit",
+    "commission_per_contract",
+    "partner_commission",
+    "smart_meter",
+    "vat_declaration_sent",
+    "vat_declaration_date",
+    "vat_declaration_expires",
+    "notes",
+    "kva",
+    "future_supplier",
+    "future_contract_start_date",
+    "future_contract_end_date",
+    "future_unit_rate_1",
+    "future_unit_rate_2",
+    "future_unit_rate_3",
+    "future_standing_charge",
+]
+
+DATE_FIELDS = [
+    "directors_approval_date",
+    "contract_start_date",
+    "contract_end_date",
+    "lock_in_date",
+    "supplier_start_date",
+    "vat_declaration_date",
+    "vat_declaration_expires",
+    "future_contract_start_date",
+    "future_contract_end_date",
+    "meter_onboarded",
+]
+
+DECIMAL_FIELDS = {
+    "eac": 2,
+    "contract_value": 2,
+    "standing_charge": 4,
+    "unit_rate_1": 6,
+    "unit_rate_2": 6,
+    "unit_rate_3": 6,
+    "feed_in_tariff": 4,
+    "commission_per_unit": 3,
+    "future_unit_rate_1": 6,
+    "future_unit_rate_2": 6,
+    "future_unit_rate_3": 6,
+    "future_standing_charge": 4,
+}
+
+FOREIGN_KEY_FIELDS = ["client", "client_manager", "supplier", "utility", "future_supplier"]
+
+# Every column written back on update, including the values derived while saving.
+UPDATE_FIELDS = [field for field in IMPORT_ORDER if field != "id"] + ["mpan_key"]
+
+# Columns that are set from other values while saving and so are validated afterwards.
+DERIVED_FIELDS = ["directors_approval_date", "vat_declaration_expires"]
+
+# Columns that can be validated on their own, without the database or the other columns.
+CLEANED_FIELDS = [
+    field.name
+    for field in Contract._meta.concrete_fields
+    if field.name in UPDATE_FIELDS
+    and field.name not in FOREIGN_KEY_FIELDS
+    and field.name not in DERIVED_FIELDS
+    and field.editable
+]
+
+
+def file_checksum(file_path):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_rows(file_path):
+    """
+    Yield the data rows of a contract sheet one at a time, without the header row.
+
+    Excel workbooks are opened in read-only mode so cells are streamed from the file
+    instead of being loaded up front. Files ending in .csv are read with the csv
+    module, with empty cells read as None like blank workbook cells.
+
+    Yields:
+        tuple: The sheet row number and the cell values of the row.
+    """
+    if str(file_path).lower().endswith(".csv"):
+        with open(file_path, newline="", encoding="utf-8-sig") as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)
+            for row_index, row in enumerate(reader, start=2):
+                yield row_index, tuple(value if value != "" else None for value in row)
+        return
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # Exported sheets often carry stale dimensions, which read-only mode relies on.
+        sheet.reset_dimensions()
+        yield from enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2)
+    finally:
+        workbook.close()
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items from an iterable without consuming it up front."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def convert_date(date_string, warnings):
+    if date_string and isinstance(date_string, str):
+        try:
+            # Try parsing DD/MM/YYYY format
+            return datetime.strptime(date_string, "%d/%m/%Y").strftime("%Y-%m-%d")
+        except ValueError:
+            try:
+                # Try parsing DD-MM-YYYY format
+                return datetime.strptime(date_string, "%d-%m-%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                warnings.append(f"Invalid date format: {date_string}. Keeping original value.")
+                return date_string
+    return date_string
+
+
+def convert_decimal(value, decimal_places, warnings):
+    if value is not None and value != "":
+        try:
+            return Decimal(value).quantize(
+                Decimal(f'0.{"0" * decimal_places}'), rounding=ROUND_HALF_UP
+            )
+        except InvalidOperation:
+            warnings.append(f"Invalid decimal value: {value}. Keeping original value.")
+            return value
+    return value
+
+
+def parse_row(row):
+    """
+    Map a sheet row onto contract fields and convert its date and decimal columns.
+
+    Returns:
+        tuple: The field values and a list of warnings about values kept as they were.
+    """
+    warnings = []
+    data = dict(zip(IMPORT_ORDER, row))
+
+    for field in DATE_FIELDS:
+        if field in data:
+            data[field] = convert_date(data[field], warnings)
+
+    for field, decimal_places in DECIMAL_FIELDS.items():
+        if field in data:
+            data[field] = convert_decimal(data[field], decimal_places, warnings)
+
+    return data, warnings
+
+
+def clean_row(row):
+    """
+    Parse a sheet row and validate the columns that need neither the database nor other rows.
+
+    This only does CPU work, so it can run in a worker process.
+
+    Returns:
+        tuple: The field values converted to Python types, the parse warnings and a
+        mapping of field names to validation messages (empty when the row is valid).
+    """
+    data, warnings = parse_row(row)
+    errors = {}
+    for name in CLEANED_FIELDS:
+        if name not in data:
+            continue
+        try:
+            data[name] = Contract._meta.get_field(name).clean(data[name], None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    return data, warnings, errors
+
+
+class BulkContractWriter:
+    """
+    Write parsed contract rows in batches with a handful of set-based queries per batch.
+
+    Foreign keys are resolved with one IN query per related model, existing contracts
+    are loaded by id in one query and rows are written with bulk_create/bulk_update
+    (history included). The business rules of Contract.save() and its pre_save signal
+    still run for every row.
+    """
+
+    def __init__(self, batch_size=1000, prevalidated=False):
+        self.batch_size = batch_size
+        # Rows passed through clean_row only need their derived values validated here.
+        self.clean_exclude = CLEANED_FIELDS if prevalidated else []
+        self.account_manager_ids = set()
+        self.created_with_ids = False
+
+    def write(self, rows):
+        """
+        Validate and write a batch of rows.
+
+        Args:
+            rows: A list of (row_index, data) tuples as produced by parse_row.
+
+        Returns:
+            tuple: The number of created and updated contracts and a list of error records.
+        """
+        errors = []
+        valid_rows = []
+        for row_index, data in rows:
+            try:
+                data["id"] = Contract._meta.pk.to_python(data["id"])
+            except ValidationError as e:
+                errors.append({"row": row_index, "error": str(e), "data": data})
+                continue
+            valid_rows.append((row_index, data))
+
+        lookups = self.resolve_foreign_keys([data for _row_index, data in valid_rows])
+        existing = Contract.objects.in_bulk([data["id"] for _row_index, data in valid_rows])
+        bands = CommissionBandIndex.load({client.pk for client in lookups["client"].values()})
+
+        # Keyed by id so that a contract listed twice is written once, with its last row.
+        to_create, to_update = {}, {}
+        for row_index, data in valid_rows:
+            contract = existing.get(data["id"])
+            try:
+                contract = self.build_contract(contract, data, lookups, bands)
+            except (ValidationError, ValueError) as e:
+                errors.append({"row": row_index, "error": str(e), "data": data})
+                continue
+            if data["id"] in existing:
+                to_update[contract.id] = contract
+            else:
+                to_create[contract.id] = contract
+
+        if to_create:
+            bulk_create_with_history(list(to_create.values()), Contract, batch_size=self.batch_size)
+            self.created_with_ids = True
+        if to_update:
+            bulk_update_with_history(
+                list(to_update.values()), Contract, UPDATE_FIELDS, batch_size=self.batch_size
+            )
+        return len(to_create), len(to_update), errors
+
+    def resolve_foreign_keys(self, rows):
+        """Returns name to instance maps for every foreign key column of the rows."""
+        names = {field: set() for field in FOREIGN_KEY_FIELDS}
+        for data in rows:
+            for field in FOREIGN_KEY_FIELDS:
+                if data.get(field):
+                    names[field].add(data[field])
+
+        suppliers = names["supplier"] | names["future_supplier"]
+        self.create_missing(Supplier, "supplier", suppliers)
+        self.create_missing(Utility, "utility", names["utility"])
+        supplier_map = Supplier.objects.in_bulk(suppliers, field_name="supplier")
+        return {
+            "client": Client.objects.in_bulk(names["client"], field_name="client"),
+            "client_manager": User.objects.in_bulk(names["client_manager"], field_name="email"),
+            "supplier": supplier_map,
+            "future_supplier": supplier_map,
+            "utility": Utility.objects.in_bulk(names["utility"], field_name="utility"),
+        }
+
+    @staticmethod
+    def create_missing(model, field_name, names):
+        existing = set(
+            model.objects.filter(**{f"{field_name}__in": names}).values_list(field_name, flat=True)
+        )
+        missing = [model(**{field_name: name}) for name in names - existing]
+        if missing:
+            bulk_create_with_history(missing, model, ignore_conflicts=True)
+
+    def build_contract(self, contract, data, lookups, bands):
+        """Apply a row to a new or existing contract and run the Contract.save() rules on it."""
+        data = dict(data)
+        for field in FOREIGN_KEY_FIELDS:
+            value = data.get(field)
+            if not value:
+                if not Contract._meta.get_field(field).null:
+                    raise ValidationError(f"{field} is required.")
+                data[field] = None
+            elif value not in lookups[field]:
+                raise ValidationError(f"{field} '{value}' does not exist.")
+            else:
+                data[field] = lookups[field][value]
+
+        if contract is None:
+            contract = Contract()
+            previous_approval = None
+        else:
+            previous_approval = contract.is_directors_approval
+            self.account_manager_ids.add(contract.client.account_manager_id)
+
+        for key, value in data.items():
+            setattr(contract, key, value)
+
+        # Mirrors the update_directors_approval_date pre_save signal.
+        if previous_approval is None:
+            if contract.is_directors_approval == Contract.BaseYesNo.YES:
+                contract.directors_approval_date = timezone.now()
+        elif previous_approval != contract.is_directors_approval:
+            contract.directors_approval_date = timezone.now()
+
+        contract.update_mpan_key()
+        bands.apply(contract, contract.utility.utility)
+        contract.validate_vat_declaration()
+        # Foreign keys were resolved above and the id is part of the only unique constraint.
+        contract.clean_for_save(Contract.Validation.LIGHT, exclude=self.clean_exclude)
+        self.account_manager_ids.add(contract.client.account_manager_id)
+        return contract
+
+    def finish(self):
+        """Bring the sequence and dashboard statistics in line with the rows written."""
+        if self.created_with_ids:
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Contract]):
+                    cursor.execute(sql)
+        rebuild_contract_stats(self.account_manager_ids)
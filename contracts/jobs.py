@@ -0,0 +1,100 @@
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .exports import (
+    COMMISSIONS_FILENAME,
+    EXCEL_AND_PDFS_FILENAME,
+    write_commissions,
+    write_excel_and_pdfs,
+)
+from .models import Contract, ExportJob
+
+# Writer function and download file name of every kind of export job.
+EXPORTERS = {
+    ExportJob.Kind.COMMISSIONS: (write_commissions, COMMISSIONS_FILENAME),
+    ExportJob.Kind.EXCEL_AND_PDFS: (write_excel_and_pdfs, EXCEL_AND_PDFS_FILENAME),
+}
+# Jobs still running this long after they started are taken for abandoned by a worker
+# that was stopped or killed.
+STALE_JOB_TIMEOUT = timedelta(hours=2)
+STALE_JOB_ERROR = "The export was abandoned by its worker before it finished."
+
+
+def enqueue_export(kind, queryset, user=None):
+    """Queue an export of the contracts of a queryset and return the job."""
+    return ExportJob.objects.create(
+        kind=kind,
+        requested_by=user,
+        contract_ids=list(queryset.order_by().values_list("id", flat=True)),
+    )
+
+
+def fail_stale_jobs():
+    """
+    Mark the jobs running for longer than STALE_JOB_TIMEOUT as failed.
+
+    They are failed rather than queued again, so an export that kills its worker is
+    not retried forever. Returns the number of jobs failed.
+    """
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status=ExportJob.Status.RUNNING, started_at__lt=now - STALE_JOB_TIMEOUT
+    ).update(status=ExportJob.Status.FAILED, error=STALE_JOB_ERROR, finished_at=now, updated_at=now)
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it, or None when the queue is empty.
+
+    Pending rows are locked with SKIP LOCKED, so several workers can poll the queue
+    without picking up the same job. Stale running jobs are failed first.
+    """
+    fail_stale_jobs()
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ExportJob.Status.PENDING)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportJob.Status.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at", "updated_at"])
+    return job
+
+
+def run_job(job):
+    """Write the export of a job to storage and record the outcome on the job."""
+    writer, filename = EXPORTERS[job.kind]
+    contracts = Contract.objects.filter(pk__in=job.contract_ids).order_by(
+        *Contract._meta.ordering, "pk"
+    )
+    try:
+        with tempfile.TemporaryFile() as file:
+            writer(contracts, file)
+            file.seek(0)
+            job.file.save(filename, File(file), save=False)
+    except Exception:
+        job.status = ExportJob.Status.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = ExportJob.Status.DONE
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def run_pending_jobs():
+    """Run queued jobs until the queue is empty and return how many were run."""
+    count = 0
+    while job := claim_next_job():
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,98 @@
+import csv
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.duplicates import DEFAULT_KEY_FIELDS, DEFAULT_STATUSES, scan_duplicates
+from contracts.models import Contract
+
+
+class Command(BaseCommand):
+    help = "Scan the whole contract table for duplicate contracts and write them as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--supplier",
+            action="append",
+            dest="suppliers",
+            help="Only scan contracts of this supplier (repeatable, defaults to all)",
+        )
+        parser.add_argument(
+            "--status",
+            action="append",
+            dest="statuses",
+            choices=Contract.ContractStatus.values,
+            help="Contract status taking part in the scan (repeatable, defaults to LIVE)",
+        )
+        parser.add_argument(
+            "--key",
+            action="append",
+            dest="key_fields",
+            help=(
+                "Column two contracts must share to be duplicates (repeatable, defaults to "
+                f"{', '.join(DEFAULT_KEY_FIELDS)})"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of MPANs scanned per query (default 5000)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Path of the CSV file to write (defaults to standard output)",
+        )
+
+    def handle(self, *args, **options):
+        key_fields = options["key_fields"] or DEFAULT_KEY_FIELDS
+        for field in key_fields:
+            try:
+                Contract._meta.get_field(field)
+            except FieldDoesNotExist:
+                raise CommandError(f"Unknown contract field: {field}")
+        if "mpan_mpr" not in key_fields:
+            raise CommandError("The key columns must include mpan_mpr.")
+
+        duplicates = scan_duplicates(
+            batch_size=options["batch_size"],
+            suppliers=options["suppliers"],
+            statuses=options["statuses"] or DEFAULT_STATUSES,
+            key_fields=key_fields,
+        )
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as csvfile:
+                count = self.write_csv(csvfile, duplicates)
+        else:
+            count = self.write_csv(self.stdout, duplicates)
+        self.stderr.write(f"Found {count} duplicate contracts.")
+
+    def write_csv(self, file, duplicates):
+        writer = csv.writer(file)
+        writer.writerow(
+            [
+                "ID",
+                "Client",
+                "Business Name",
+                "MPAN",
+                "Contract Status",
+                "Contract End Date",
+                "Supplier",
+            ]
+        )
+        count = 0
+        for contract in duplicates:
+            writer.writerow(
+                [
+                    contract.id,
+                    contract.client.client,
+                    contract.business_name,
+                    contract.mpan_mpr,
+                    contract.contract_status,
+                    contract.contract_end_date or "",
+                    contract.supplier.supplier,
+                ]
+            )
+            count += 1
+        return count
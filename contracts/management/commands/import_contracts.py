@@ -1,238 +1,79 @@
-import openpyxl
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from contracts.models import Contract
+from contracts.importer import (
+    BulkContractWriter,
+    batched,
+    clean_row,
+    file_checksum,
+    parse_row,
+    read_rows,
+)
+from contracts.models import Contract, ImportCheckpoint
 from clients.models import Client
 from utilities.models import Supplier, Utility
 from django.db.models import Max
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from datetime import datetime
 import csv
 
 
 class Command(BaseCommand):
-    help = "Import data from Excel file with unique ID handling and foreign key relationships"
+    help = (
+        "Import data from an Excel or CSV file with unique ID handling and foreign key "
+        "relationships"
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("file_path", type=str, help="Path to the Excel file")
+        parser.add_argument("file_path", type=str, help="Path to the Excel or CSV file")
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Resolve foreign keys and write contracts in batches instead of row by row",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows per bulk insert or update statement (default 1000)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows committed per transaction and checkpoint (default 1000)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Parse and validate rows in this many worker processes (default 0, in process)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue after the last row committed by a previous run of the same file",
+        )
 
     def handle(self, *args, **options):
         file_path = options["file_path"]
         error_log_path = "import_errors.csv"
 
-        import_order = [
-            "id",
-            "contract_type",
-            "seamless_updated",
-            "contract_status",
-            "dwellent_id",
-            "bid_id",
-            "portal_status",
-            "client",
-            "client_group",
-            "seed_stock",
-            "client_manager",
-            "is_directors_approval",
-            "directors_approval_date",
-            "business_name",
-            "company_reg_number",
-            "utility",
-            "top_line",
-            "mpan_mpr",
-            "meter_serial_number",
-            "meter_onboarded",
-            "meter_status",
-            "building_name",
-            "site_address",
-            "billing_address",
-            "supplier",
-            "supplier_coding",
-            "contract_start_date",
-            "contract_end_date",
-            "lock_in_date",
-            "supplier_start_date",
-            "account_number",
-            "eac",
-            "day_consumption",
-            "night_consumption",
-            "vat_rate",
-            "contract_value",
-            "standing_charge",
-            "sc_frequency",
-            "unit_rate_1",
-            "unit_rate_2",
-            "unit_rate_3",
-            "feed_in_tariff",
-            "seamless_status",
-            "profile",
-            "is_ooc",
-            "service_type",
-            "pence_per_kilowatt",
-            "day_kilowatt_hour_rate",
-            "night_rate",
-            "annualised_budget",
-            "commission_per_annum",
-            "commission_per_unit",
-            "commission_per_contract",
-            "partner_commission",
-            "smart_meter",
-            "vat_declaration_sent",
-            "vat_declaration_date",
-            "vat_declaration_expires",
-            "notes",
-            "kva",
-            "future_supplier",
-            "future_contract_start_date",
-            "future_contract_end_date",
-            "future_unit_rate_1",
-            "future_unit_rate_2",
-            "future_unit_rate_3",
-            "future_standing_charge",
-        ]
-
-        date_fields = [
-            "directors_approval_date",
-            "contract_start_date",
-            "contract_end_date",
-            "lock_in_date",
-            "supplier_start_date",
-            "vat_declaration_date",
-            "vat_declaration_expires",
-            "future_contract_start_date",
-            "future_contract_end_date",
-            "meter_onboarded",
-        ]
-
-        decimal_fields = {
-            "eac": 2,
-            "contract_value": 2,
-            "standing_charge": 4,
-            "unit_rate_1": 6,
-            "unit_rate_2": 6,
-            "unit_rate_3": 6,
-            "feed_in_tariff": 4,
-            "commission_per_unit": 3,
-            "future_unit_rate_1": 6,
-            "future_unit_rate_2": 6,
-            "future_unit_rate_3": 6,
-            "future_standing_charge": 4,
-        }
-
-        def convert_date(date_string):
-            if date_string and isinstance(date_string, str):
-                try:
-                    # Try parsing DD/MM/YYYY format
-                    return datetime.strptime(date_string, "%d/%m/%Y").strftime("%Y-%m-%d")
-                except ValueError:
-                    try:
-                        # Try parsing DD-MM-YYYY format
-                        return datetime.strptime(date_string, "%d-%m-%Y").strftime("%Y-%m-%d")
-                    except ValueError:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"Invalid date format: {date_string}. Keeping original value."
-                            )
-                        )
-                        return date_string
-            return date_string
-
-        def convert_decimal(value, decimal_places):
-            if value is not None and value != "":
-                try:
-                    return Decimal(value).quantize(
-                        Decimal(f'0.{"0" * decimal_places}'), rounding=ROUND_HALF_UP
-                    )
-                except InvalidOperation:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Invalid decimal value: {value}. Keeping original value."
-                        )
-                    )
-                    return value
-            return value
-
         try:
-            workbook = openpyxl.load_workbook(file_path)
-            sheet = workbook.active
-
-            # Get the maximum ID currently in the database
-            max_id = Contract.objects.aggregate(Max("id"))["id__max"] or 0
-
-            error_records = []
-
-            with transaction.atomic():
-                for row_index, row in enumerate(
-                    sheet.iter_rows(min_row=2, values_only=True), start=2
-                ):
-                    data = dict(zip(import_order, row))
-
-                    # Handle the unique ID
-                    if data["id"] is None or data["id"] == "":
-                        max_id += 1
-                        data["id"] = max_id
-
-                    # Convert date fields
-                    for field in date_fields:
-                        if field in data:
-                            data[field] = convert_date(data[field])
-
-                    # Convert decimal fields
-                    for field, decimal_places in decimal_fields.items():
-                        if field in data:
-                            data[field] = convert_decimal(data[field], decimal_places)
+            checkpoint, start_after = self.get_checkpoint(file_path, options["resume"])
+            if checkpoint.is_completed:
+                self.stdout.write(self.style.SUCCESS(f"{file_path} has already been imported."))
+                return
 
-                    # Handle foreign key relationships
-                    try:
-                        # Client foreign key
-                        client_value = data.get("client")
-                        if client_value:
-                            client, created = Client.objects.get_or_create(client=client_value)
-                            data["client"] = client
-
-                        # Supplier foreign key
-                        supplier_name = data.get("supplier")
-                        if supplier_name:
-                            supplier, created = Supplier.objects.get_or_create(
-                                supplier=supplier_name
-                            )
-                            data["supplier"] = supplier
-
-                        # Future Supplier foreign key
-                        future_supplier_name = data.get("future_supplier")
-                        if future_supplier_name:
-                            future_supplier, created = Supplier.objects.get_or_create(
-                                supplier=future_supplier_name
-                            )
-                            data["future_supplier"] = future_supplier
-
-                        # Utility foreign key
-                        utility_name = data.get("utility")
-                        if utility_name:
-                            utility, created = Utility.objects.get_or_create(utility=utility_name)
-                            data["utility"] = utility
-
-                        # Check if the record exists
-                        existing_obj = Contract.objects.filter(id=data["id"]).first()
-
-                        if existing_obj:
-                            # Update existing record
-                            for key, value in data.items():
-                                setattr(existing_obj, key, value)
-                            existing_obj.save()
-                            self.stdout.write(
-                                self.style.SUCCESS(f"Updated record with ID {existing_obj.id}")
-                            )
-                        else:
-                            # Create new record
-                            new_obj = Contract.objects.create(**data)
-                            self.stdout.write(
-                                self.style.SUCCESS(f"Created new record with ID {new_obj.id}")
-                            )
-
-                    except Exception as e:
-                        error_message = f"Error processing record in row {row_index}: {str(e)}"
-                        self.stdout.write(self.style.ERROR(error_message))
-                        error_records.append({"row": row_index, "error": str(e), "data": data})
+            rows = (
+                (row_index, row)
+                for row_index, row in read_rows(file_path)
+                if row_index > start_after
+            )
+            self.invalid_records = []
+            rows = self.parse_rows(rows, options["workers"], options["chunk_size"])
+            error_records = self.import_chunks(rows, checkpoint, options)
+            error_records = sorted(
+                self.invalid_records + error_records, key=lambda record: record["row"]
+            )
 
             # Write error records to CSV file
             if error_records:
@@ -254,3 +95,185 @@ class Command(BaseCommand):
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error occurred: {str(e)}"))
+
+    def parse_rows(self, rows, workers=0, chunk_size=1000):
+        """Yield (row_index, data) for each valid sheet row, assigning ids to rows without one."""
+        # Get the maximum ID currently in the database
+        max_id = Contract.objects.aggregate(Max("id"))["id__max"] or 0
+
+        for row_index, data, warnings, errors in self.clean_rows(rows, workers, chunk_size):
+            for warning in warnings:
+                self.stdout.write(self.style.WARNING(warning))
+            if errors:
+                error = "; ".join(
+                    f"{field}: {' '.join(messages)}" for field, messages in errors.items()
+                )
+                self.stdout.write(
+                    self.style.ERROR(f"Error processing record in row {row_index}: {error}")
+                )
+                self.invalid_records.append({"row": row_index, "error": error, "data": data})
+                continue
+
+            # Handle the unique ID
+            if data["id"] is None or data["id"] == "":
+                max_id += 1
+                data["id"] = max_id
+            yield row_index, data
+
+    def clean_rows(self, rows, workers, chunk_size):
+        """
+        Yield (row_index, data, warnings, errors) for each sheet row, in sheet order.
+
+        With workers, rows are parsed and validated by clean_row in a process pool a
+        chunk ahead of the rows being written, so the database writes in this process
+        overlap with the CPU work of the next chunk.
+        """
+        if not workers:
+            for row_index, row in rows:
+                data, warnings = parse_row(row)
+                yield row_index, data, warnings, {}
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = None
+            for chunk in batched(rows, chunk_size):
+                results = pool.map(
+                    clean_row,
+                    [row for _row_index, row in chunk],
+                    chunksize=max(1, len(chunk) // (workers * 4)),
+                )
+                if pending:
+                    yield from self.zip_results(*pending)
+                pending = chunk, results
+            if pending:
+                yield from self.zip_results(*pending)
+
+    @staticmethod
+    def zip_results(chunk, results):
+        for (row_index, _row), (data, warnings, errors) in zip(chunk, results):
+            yield row_index, data, warnings, errors
+
+    def get_checkpoint(self, file_path, resume):
+        """Returns the checkpoint of the file and the last sheet row already committed."""
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            file_hash=file_checksum(file_path), defaults={"file_name": file_path}
+        )
+        if resume and not created:
+            if not checkpoint.is_completed:
+                self.stdout.write(f"Resuming after row {checkpoint.last_row}")
+            return checkpoint, checkpoint.last_row
+
+        # A fresh run starts from the header row again.
+        checkpoint.file_name = file_path
+        checkpoint.last_row = 1
+        checkpoint.is_completed = False
+        checkpoint.save()
+        return checkpoint, 1
+
+    def import_chunks(self, rows, checkpoint, options):
+        """
+        Import the rows in chunks, each committed with its checkpoint in one transaction.
+
+        Locks on the contract table are only held for the duration of a chunk and a
+        failure rolls back the current chunk only.
+        """
+        writer = (
+            BulkContractWriter(
+                batch_size=options["batch_size"], prevalidated=bool(options["workers"])
+            )
+            if options["bulk"]
+            else None
+        )
+        error_records = []
+        created = updated = 0
+        try:
+            for chunk in batched(rows, options["chunk_size"]):
+                with transaction.atomic():
+                    if writer:
+                        chunk_created, chunk_updated, errors = writer.write(chunk)
+                        created += chunk_created
+                        updated += chunk_updated
+                        for record in errors:
+                            self.stdout.write(
+                                self.style.ERROR(
+                                    f"Error processing record in row {record['row']}: "
+                                    f"{record['error']}"
+                                )
+                            )
+                    else:
+                        errors = self.import_rows(chunk)
+                    checkpoint.last_row = chunk[-1][0]
+                    checkpoint.save(update_fields=["last_row", "updated_at"])
+                error_records.extend(errors)
+        except Exception:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Import stopped after row {checkpoint.last_row}. "
+                    "Run the command again with --resume to continue from there."
+                )
+            )
+            raise
+        finally:
+            if writer:
+                writer.finish()
+
+        checkpoint.is_completed = True
+        checkpoint.save(update_fields=["is_completed", "updated_at"])
+        if writer:
+            self.stdout.write(
+                self.style.SUCCESS(f"Created {created} and updated {updated} records")
+            )
+        return error_records
+
+    def import_rows(self, rows):
+        error_records = []
+        for row_index, data in rows:
+            try:
+                # A savepoint per row keeps a failed row from aborting the whole chunk.
+                with transaction.atomic():
+                    self.import_row(data)
+            except Exception as e:
+                error_message = f"Error processing record in row {row_index}: {str(e)}"
+                self.stdout.write(self.style.ERROR(error_message))
+                error_records.append({"row": row_index, "error": str(e), "data": data})
+        return error_records
+
+    def import_row(self, data):
+        # Client foreign key
+        client_value = data.get("client")
+        if client_value:
+            client, created = Client.objects.get_or_create(client=client_value)
+            data["client"] = client
+
+        # Supplier foreign key
+        supplier_name = data.get("supplier")
+        if supplier_name:
+            supplier, created = Supplier.objects.get_or_create(supplier=supplier_name)
+            data["supplier"] = supplier
+
+        # Future Supplier foreign key
+        future_supplier_name = data.get("future_supplier")
+        if future_supplier_name:
+            future_supplier, created = Supplier.objects.get_or_create(supplier=future_supplier_name)
+            data["future_supplier"] = future_supplier
+
+        # Utility foreign key
+        utility_name = data.get("utility")
+        if utility_name:
+            utility, created = Utility.objects.get_or_create(utility=utility_name)
+            data["utility"] = utility
+
+        # Check if the record exists
+        existing_obj = Contract.objects.filter(id=data["id"]).first()
+
+        if existing_obj:
+            # Update existing record
+            for key, value in data.items():
+                setattr(existing_obj, key, value)
+            existing_obj.save(validation=Contract.Validation.LIGHT)
+            self.stdout.write(self.style.SUCCESS(f"Updated record with ID {existing_obj.id}"))
+        else:
+            # Create new record
+            new_obj = Contract(**data)
+            new_obj.save(force_insert=True, validation=Contract.Validation.LIGHT)
+            self.stdout.write(self.style.SUCCESS(f"Created new record with ID {new_obj.id}"))
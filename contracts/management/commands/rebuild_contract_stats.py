@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from contracts.models import ContractStatistics
+from contracts.stats import compute_contract_counts, flatten_counts, rebuild_contract_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per account manager contract statistics from the contract table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--manager",
+            action="append",
+            dest="managers",
+            help="Email of an account manager to rebuild (repeatable, defaults to all)",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the stored statistics with freshly computed ones",
+        )
+
+    def handle(self, *args, **options):
+        # Any user owning clients has dashboard counters, whatever their role.
+        account_managers = User.objects.filter(
+            Q(account_manager_clients__isnull=False) | Q(contract_statistics__isnull=False)
+        )
+        if options["managers"]:
+            account_managers = account_managers.filter(email__in=options["managers"])
+        account_managers = account_managers.distinct().order_by("email")
+        account_managers = list(account_managers.values_list("id", "email"))
+
+        if options["verify"]:
+            self.verify(account_managers)
+            return
+
+        rebuild_contract_stats(account_manager_id for account_manager_id, _ in account_managers)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt statistics for {len(account_managers)} account managers.")
+        )
+
+    def verify(self, account_managers):
+        stored = dict(
+            ContractStatistics.objects.filter(
+                account_manager_id__in=[
+                    account_manager_id for account_manager_id, _ in account_managers
+                ]
+            ).values_list("account_manager_id", "counts")
+        )
+        mismatches = 0
+        for account_manager_id, email in account_managers:
+            if account_manager_id not in stored:
+                self.stdout.write(f"{email}: no stored statistics, computed on next read")
+                continue
+            expected = self.non_zero(compute_contract_counts(account_manager_id))
+            actual = self.non_zero(stored[account_manager_id])
+            if expected != actual:
+                mismatches += 1
+                differences = ", ".join(
+                    f"{'/'.join(key)}: stored {actual.get(key, 0)}, actual {expected.get(key, 0)}"
+                    for key in sorted(set(expected) | set(actual))
+                    if actual.get(key, 0) != expected.get(key, 0)
+                )
+                self.stdout.write(self.style.ERROR(f"{email}: {differences}"))
+
+        if mismatches:
+            self.stdout.write(
+                self.style.WARNING(f"{mismatches} account managers have stale statistics.")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Stored statistics are up to date."))
+
+    @staticmethod
+    def non_zero(counts):
+        return {key: count for key, count in flatten_counts(counts).items() if count}
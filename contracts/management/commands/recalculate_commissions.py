@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from contracts.models import Contract
+from contracts.recalculation import recalculate_commissions
+
+
+class Command(BaseCommand):
+    help = "Recalculate contract commissions from the current commission bands"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--client",
+            action="append",
+            dest="clients",
+            help="Name of a client whose contracts to recalculate (repeatable)",
+        )
+        parser.add_argument(
+            "--supplier",
+            action="append",
+            dest="suppliers",
+            help="Name of a supplier whose contracts to recalculate (repeatable)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of contracts written per batch (default 1000)",
+        )
+
+    def handle(self, *args, **options):
+        contracts = Contract.objects.all()
+        if options["clients"]:
+            contracts = contracts.filter(client__client__in=options["clients"])
+        if options["suppliers"]:
+            contracts = contracts.filter(supplier__supplier__in=options["suppliers"])
+
+        changed = recalculate_commissions(contracts, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated the commission of {changed} contracts."))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from contracts.jobs import claim_next_job, run_job
+from contracts.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = "Run queued contract export jobs, polling the queue until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs currently queued and exit instead of polling",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls of an empty queue (default 5)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                # Long running workers must not hold on to dropped connections.
+                close_old_connections()
+                continue
+
+            run_job(job)
+            if job.status == ExportJob.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Finished {job}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Failed {job}: {job.error.splitlines()[-1]}"))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_clientmanager_options"),
+        ("contracts", "0039_contract_bid_id_contract_dwellent_id_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractStatistics",
+            fields=[
+                (
+                    "account_manager",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="contract_statistics",
+                        serialize=False,
+                        to="users.accountmanager",
+                    ),
+                ),
+                ("counts", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Contract Statistics",
+                "verbose_name_plural": "Contract Statistics",
+                "db_table": "contract_statistics",
+            },
+        ),
+    ]
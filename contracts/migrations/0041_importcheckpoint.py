@@ -0,0 +1,41 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0040_contractstatistics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "file_hash",
+                    models.CharField(max_length=64, unique=True, verbose_name="File Hash"),
+                ),
+                ("file_name", models.CharField(max_length=255, verbose_name="File Name")),
+                (
+                    "last_row",
+                    models.PositiveIntegerField(default=1, verbose_name="Last Committed Row"),
+                ),
+                ("is_completed", models.BooleanField(default=False, verbose_name="Completed")),
+            ],
+            options={
+                "verbose_name": "Import Checkpoint",
+                "verbose_name_plural": "Import Checkpoints",
+                "db_table": "contract_import_checkpoints",
+            },
+        ),
+    ]
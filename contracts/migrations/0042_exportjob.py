@@ -0,0 +1,90 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contracts", "0041_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("COMMISSIONS", "Client Commissions"),
+                            ("EXCEL_AND_PDFS", "Excel and individual PDFs"),
+                        ],
+                        max_length=20,
+                        verbose_name="Export",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("DONE", "Done"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("contract_ids", models.JSONField(default=list, verbose_name="Contract IDs")),
+                (
+                    "file",
+                    models.FileField(blank=True, upload_to="exports/%Y/%m/", verbose_name="File"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Started At"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Finished At"),
+                ),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="export_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Requested By",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Export Job",
+                "verbose_name_plural": "Export Jobs",
+                "db_table": "contract_export_jobs",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"], name="contract_ex_status_cdfb83_idx"
+                    )
+                ],
+            },
+        ),
+    ]
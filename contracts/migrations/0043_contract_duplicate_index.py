@@ -0,0 +1,23 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:42
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking client_contracts against writes.
+    atomic = False
+
+    dependencies = [
+        ("contracts", "0042_exportjob"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                fields=["mpan_mpr", "contract_end_date", "contract_status"],
+                name="client_cont_mpan_mp_131632_idx",
+            ),
+        ),
+    ]
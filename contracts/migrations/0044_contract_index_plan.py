@@ -0,0 +1,75 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:43
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Indexes are built and dropped concurrently so client_contracts stays writable.
+    atomic = False
+
+    dependencies = [
+        ("clients", "0010_alter_client_export_confirmed_and_more"),
+        ("contracts", "0043_contract_duplicate_index"),
+    ]
+
+    operations = [
+        # New indexes first, so the queries they replace are never left without one.
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                fields=["client", "contract_status"], name="contract_client_status_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(fields=["contract_end_date", "id"], name="contract_end_date_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("contract_status", "LIVE")),
+                fields=["contract_end_date"],
+                name="contract_live_end_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("is_ooc", "YES")),
+                fields=["contract_end_date"],
+                name="contract_ooc_end_date_idx",
+            ),
+        ),
+        # mpan_mpr is the prefix of the duplicate detection index.
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="client_cont_mpan_mp_61a064_idx",
+        ),
+        # client and -client duplicate the foreign key index, itself now covered by
+        # (client, contract_status).
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="client_cont_client__b89d8d_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="client_cont_client__ad3c39_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="client_cont_busines_3058d6_idx",
+        ),
+        migrations.AlterField(
+            model_name="contract",
+            name="client",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="client_contracts",
+                to="clients.client",
+                verbose_name="Client Name",
+            ),
+        ),
+    ]
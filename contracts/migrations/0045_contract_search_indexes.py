@@ -0,0 +1,47 @@
+# Generated by Django 4.2.15 on 2026-10-18 13:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently so client_contracts stays writable.
+    atomic = False
+
+    dependencies = [
+        ("contracts", "0044_contract_index_plan"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="contract",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "business_name", "client_group", "site_address", config="simple"
+                ),
+                name="contract_search_vector_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("mpan_mpr"), name="text_pattern_ops"
+                ),
+                name="contract_mpan_prefix_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("meter_serial_number"),
+                    name="text_pattern_ops",
+                ),
+                name="contract_serial_prefix_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.15 on 2026-10-18 14:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models, transaction
+
+# Rows given their key per transaction, so no statement locks the whole table.
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalise_mpan(value):
+    # contracts.models.normalise_mpan as of this migration. It runs in Python rather
+    # than SQL because the database's whitespace class and upper casing differ from
+    # Python's, and backfilled keys must match the ones save() writes.
+    return "".join(value.split()).upper() if value else ""
+
+
+def backfill_mpan_keys(apps, schema_editor):
+    using = schema_editor.connection.alias
+    for model_name in ("Contract", "HistoricalContract"):
+        manager = apps.get_model("contracts", model_name)._base_manager.using(using)
+        last_pk = None
+        while True:
+            rows = manager.order_by("pk")
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            rows = list(rows.values_list("pk", "mpan_mpr")[:BACKFILL_BATCH_SIZE])
+            if not rows:
+                break
+            with transaction.atomic(using=using):
+                manager.bulk_update(
+                    [
+                        manager.model(pk=pk, mpan_key=normalise_mpan(mpan_mpr))
+                        for pk, mpan_mpr in rows
+                    ],
+                    ["mpan_key"],
+                )
+            last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    # The index is built concurrently so client_contracts stays writable.
+    atomic = False
+
+    dependencies = [
+        ("contracts", "0045_contract_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="mpan_key",
+            field=models.CharField(
+                default="", editable=False, max_length=255, verbose_name="MPAN Key"
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="historicalcontract",
+            name="mpan_key",
+            field=models.CharField(
+                default="", editable=False, max_length=255, verbose_name="MPAN Key"
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_mpan_keys, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(fields=["mpan_key"], name="contract_mpan_key_idx"),
+        ),
+    ]
@@ -1,16 +1,33 @@
 from datetime import date
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
 
 from clients.models import Client
-from commissions.models import ElectricityCommission, GasCommission
-from users.models import ClientManager
+from core.models import FieldTrackerMixin, TimeStampedModel
+from commissions.bands import matching_band_rates
+from users.models import AccountManager, ClientManager
 from utilities.models import Supplier, Utility
 
 
+# Free text columns of a contract searched from the admin search box. The GIN index on
+# this expression is only used by queries spelling it exactly the same way.
+CONTRACT_SEARCH_VECTOR = SearchVector(
+    "business_name", "client_group", "site_address", config="simple"
+)
+
+
+def normalise_mpan(value):
+    """Returns an MPAN or MPR in the form it is stored in Contract.mpan_key."""
+    return "".join(value.split()).upper() if value else ""
+
+
 class ContractsManager(models.Manager):
     def get_queryset(self):
         """
@@ -81,7 +98,30 @@ class ContractTypeQuerySet(models.QuerySet):
         )
 
 
-class Contract(models.Model):
+class Contract(FieldTrackerMixin, models.Model):
+    # Compared with their stored values by the pre_save signals: the directors approval
+    # date and every value the dashboard counters are derived from.
+    tracked_fields = (
+        "is_directors_approval",
+        "client",
+        "contract_status",
+        "contract_type",
+        "is_ooc",
+        "utility",
+        "supplier",
+        "contract_end_date",
+    )
+
+    class Validation(models.TextChoices):
+        """How much of full_clean() save() runs. The business rules always run."""
+
+        FULL = "full", _("Every field, foreign key and constraint")
+        LIGHT = "light", _("Field values only, without database lookups")
+        NONE = "none", _("Nothing, for rows that were validated before")
+
+    # The validation level of save() when none is passed, settable per instance.
+    save_validation = Validation.FULL
+
     class BaseYesNo(models.TextChoices):
         YES = "YES", _("Yes")
         NO = "NO", _("No")
@@ -150,6 +190,8 @@ class Contract(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Client Name",
         related_name="client_contracts",
+        # Covered by the (client, contract_status) index.
+        db_index=False,
     )
     client_group = models.CharField(
         max_length=255, null=True, blank=True, verbose_name="Client Group"
@@ -180,6 +222,8 @@ class Contract(models.Model):
     )
     top_line = models.CharField(verbose_name="Top Line", max_length=40, null=True, blank=True)
     mpan_mpr = models.CharField(verbose_name="MPAN/MPR", max_length=255)
+    # The MPAN upper cased and without whitespace, for exact and bulk lookups.
+    mpan_key = models.CharField(verbose_name="MPAN Key", max_length=255, editable=False)
     meter_serial_number = models.CharField(
         max_length=100,
         null=True,
@@ -402,12 +446,39 @@ class Contract(models.Model):
     contracts = ContractTypeQuerySet.as_manager()
 
     class Meta:
+        # Single column foreign key indexes cover the supplier, utility and client manager
+        # filters. B-tree indexes are read in both directions, so none are descending.
         indexes = [
-            models.Index(fields=["mpan_mpr"]),
-            models.Index(fields=["client"]),
-            models.Index(fields=["-client"]),
             models.Index(fields=["business_name"]),
-            models.Index(fields=["-business_name"]),
+            # MPAN lookups and duplicate detection, which groups and ranges by these columns.
+            models.Index(fields=["mpan_mpr", "contract_end_date", "contract_status"]),
+            # A client's contracts, optionally by status (dashboards, client pages).
+            models.Index(fields=["client", "contract_status"], name="contract_client_status_idx"),
+            # The default ordering, with id as the tie breaker for keyset pagination.
+            models.Index(fields=["contract_end_date", "id"], name="contract_end_date_id_idx"),
+            # Renewal work lists only look at live and out of contract rows.
+            models.Index(
+                fields=["contract_end_date"],
+                condition=models.Q(contract_status="LIVE"),
+                name="contract_live_end_date_idx",
+            ),
+            models.Index(
+                fields=["contract_end_date"],
+                condition=models.Q(is_ooc="YES"),
+                name="contract_ooc_end_date_idx",
+            ),
+            models.Index(fields=["mpan_key"], name="contract_mpan_key_idx"),
+            # Admin search: full text over the free text columns, case insensitive
+            # prefixes over the meter identifiers.
+            GinIndex(CONTRACT_SEARCH_VECTOR, name="contract_search_vector_idx"),
+            models.Index(
+                OpClass(Upper("mpan_mpr"), name="text_pattern_ops"),
+                name="contract_mpan_prefix_idx",
+            ),
+            models.Index(
+                OpClass(Upper("meter_serial_number"), name="text_pattern_ops"),
+                name="contract_serial_prefix_idx",
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -431,22 +502,23 @@ class Contract(models.Model):
         return f"{self.business_name} with mpan {self.mpan_mpr}"
 
     def calculate_commission(self):
-        """Calculate and set commission rates based on utility type."""
-        commission_model = None
-
-        if self.utility.utility == "Electricity":
-            commission_model = ElectricityCommission
-        elif self.utility.utility == "Gas":
-            commission_model = GasCommission
-
-        if commission_model:
-            commission = commission_model.objects.filter(
-                eac_from__lte=self.eac, eac_to__gte=self.eac, client=self.client
-            ).first()
+        """
+        Calculate and set commission rates based on utility type.
 
-            if commission:
-                self.commission_per_annum = commission.commission_per_annum
-                self.commission_per_unit = commission.commission_per_unit
+        save() does not get the in-memory band lookup: it reads the one band covering
+        the EAC with a single query, so a band edited in one process is used by the
+        next save in any other. Imports and bulk recalculation look the rates up in a
+        CommissionBandIndex loaded once for all their contracts.
+        """
+        utility_field = self._meta.get_field("utility")
+        rates = matching_band_rates(
+            self.client_id,
+            self.utility_id,
+            self._meta.get_field("eac").to_python(self.eac),
+            utility=self.utility.utility if utility_field.is_cached(self) else None,
+        )
+        if rates:
+            self.commission_per_annum, self.commission_per_unit = rates
 
     def validate_vat_declaration(self):
         """Validate VAT declaration and set appropriate values."""
@@ -466,11 +538,40 @@ class Contract(models.Model):
         ]:
             raise ValidationError("Invalid VAT rate")
 
-    def save(self, *args, **kwargs):
+    def update_mpan_key(self):
+        """Keep the normalised MPAN in step with mpan_mpr."""
+        self.mpan_key = normalise_mpan(self.mpan_mpr)
+
+    def clean_for_save(self, validation=Validation.FULL, exclude=None):
+        """Run the part of full_clean() a validation level asks for."""
+        if validation == self.Validation.FULL:
+            self.full_clean(exclude=exclude)
+        elif validation == self.Validation.LIGHT:
+            # Foreign keys are checked for existence and the unique constraint against the
+            # table, each with a query, so those checks are left to the database.
+            foreign_keys = [field.name for field in self._meta.concrete_fields if field.is_relation]
+            self.full_clean(
+                exclude=foreign_keys + list(exclude or []),
+                validate_unique=False,
+                validate_constraints=False,
+            )
+        elif validation != self.Validation.NONE:
+            raise ValueError(f"Unknown validation level {validation!r}.")
+
+    def save(self, *args, validation=None, **kwargs):
+        """
+        Apply the business rules, validate and save.
+
+        Args:
+            validation: A Contract.Validation level, defaulting to save_validation.
+                Trusted writers whose foreign keys are saved instances can pass LIGHT
+                to skip the validation queries.
+        """
+        self.update_mpan_key()
         self.calculate_commission()  # Calculate commission before saving
         self.validate_vat_declaration()  # Validate VAT declaration
 
-        self.full_clean()  # Call the clean method before saving
+        self.clean_for_save(validation or self.save_validation)
         super().save(*args, **kwargs)  # Call the original save method to save the model
 
     # Returns the number of days left on the contract
@@ -484,3 +585,98 @@ class Contract(models.Model):
     @property
     def contract_term(self):
         return self.client.contract_term
+
+
+class ContractStatistics(models.Model):
+    """
+    Denormalised dashboard counters for an account manager.
+
+    The counts are kept in step with every contract and client write by
+    contracts.stats, so the dashboard reads a single row by primary key.
+    """
+
+    account_manager = models.OneToOneField(
+        AccountManager,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="contract_statistics",
+    )
+    counts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "contract_statistics"
+        verbose_name = _("Contract Statistics")
+        verbose_name_plural = _("Contract Statistics")
+
+    def __str__(self):
+        return f"Contract statistics for {self.account_manager}"
+
+
+class ImportCheckpoint(TimeStampedModel):
+    """
+    Progress of a contract import, keyed by the checksum of the imported file.
+
+    The last committed sheet row is stored in the same transaction as the rows
+    themselves, so an interrupted import can be resumed from exactly that point.
+    """
+
+    file_hash = models.CharField(max_length=64, unique=True, verbose_name="File Hash")
+    file_name = models.CharField(max_length=255, verbose_name="File Name")
+    last_row = models.PositiveIntegerField(default=1, verbose_name="Last Committed Row")
+    is_completed = models.BooleanField(default=False, verbose_name="Completed")
+
+    class Meta:
+        db_table = "contract_import_checkpoints"
+        verbose_name = _("Import Checkpoint")
+        verbose_name_plural = _("Import Checkpoints")
+
+    def __str__(self):
+        return f"{self.file_name} (row {self.last_row})"
+
+
+class ExportJob(TimeStampedModel):
+    """
+    A contract export queued from the admin and produced by the run_export_jobs worker.
+
+    The selected contracts are stored by id, so the export reflects the selection at
+    the time it was requested.
+    """
+
+    class Kind(models.TextChoices):
+        COMMISSIONS = "COMMISSIONS", "Client Commissions"
+        EXCEL_AND_PDFS = "EXCEL_AND_PDFS", "Excel and individual PDFs"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name="Export")
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name="Status"
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="export_jobs",
+        verbose_name="Requested By",
+    )
+    contract_ids = models.JSONField(default=list, verbose_name="Contract IDs")
+    file = models.FileField(upload_to="exports/%Y/%m/", blank=True, verbose_name="File")
+    error = models.TextField(blank=True, verbose_name="Error")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished At")
+
+    class Meta:
+        db_table = "contract_export_jobs"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+        verbose_name = _("Export Job")
+        verbose_name_plural = _("Export Jobs")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} export #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,46 @@
+from django.db import transaction
+from simple_history.utils import bulk_update_with_history
+
+from commissions.bands import CommissionBandIndex
+
+from .importer import batched
+from .models import Contract
+
+COMMISSION_FIELDS = ["commission_per_annum", "commission_per_unit"]
+
+
+def recalculate_commissions(queryset, batch_size=1000):
+    """
+    Recompute the commission rates of a queryset of contracts from the current bands.
+
+    The bands of every client involved are loaded once into a band index and the
+    contracts are read as plain values, so only the contracts whose rates actually
+    change are loaded in full and written back with bulk_update, history included.
+    Contracts without a matching band keep their rates, as they do when saved.
+
+    Returns:
+        int: The number of contracts whose commission changed.
+    """
+    contracts = queryset.order_by().values_list(
+        "id", "client_id", "utility__utility", "eac", *COMMISSION_FIELDS
+    )
+    client_ids = queryset.order_by().values("client_id").distinct()
+    bands = CommissionBandIndex.load(client_ids)
+
+    changes = {}
+    for pk, client_id, utility, eac, *current in contracts.iterator(chunk_size=batch_size):
+        rates = bands.lookup(utility, client_id, eac)
+        if rates and list(rates) != current:
+            changes[pk] = rates
+
+    for batch in batched(changes, batch_size):
+        with transaction.atomic():
+            batch_contracts = list(
+                Contract.objects.select_for_update(of=("self",)).filter(pk__in=batch)
+            )
+            for contract in batch_contracts:
+                contract.commission_per_annum, contract.commission_per_unit = changes[contract.pk]
+            bulk_update_with_history(
+                batch_contracts, Contract, COMMISSION_FIELDS, batch_size=batch_size
+            )
+    return len(changes)
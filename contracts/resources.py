@@ -1,38 +1,66 @@
 from import_export import fields, resources
-from import_export.widgets import ForeignKeyWidget
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 from .models import Contract
+from .stats import rebuild_contract_stats
 from clients.models import Client
+from commissions.bands import CommissionBandIndex
+from core.resources import CachedForeignKeyMixin, CachedForeignKeyWidget, StoredDryRunMixin
 from utilities.models import Supplier, Utility
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
 
 User = get_user_model()
 
 
-class ContractResource(resources.ModelResource):
+class ContractResource(StoredDryRunMixin, CachedForeignKeyMixin, resources.ModelResource):
+    """
+    Contract import with a handful of set-based queries per import.
+
+    Foreign keys are resolved with one query per column and batch of rows, existing
+    contracts are loaded by id in one query and rows are written with bulk_create and
+    bulk_update (history included). The business rules of Contract.save() and its
+    pre_save signals still run for every row, in before_save_instance, except for rows
+    replayed from the stored dry run, whose values already went through them.
+    """
+
     client = fields.Field(
-        column_name="client", attribute="client", widget=ForeignKeyWidget(Client, "client")
+        column_name="client",
+        attribute="client",
+        widget=CachedForeignKeyWidget(Client, "client"),
     )
     client_manager = fields.Field(
         column_name="client_manager",
         attribute="client_manager",
-        widget=ForeignKeyWidget(User, "email"),
+        widget=CachedForeignKeyWidget(User, "email"),
     )
     supplier = fields.Field(
-        column_name="supplier", attribute="supplier", widget=ForeignKeyWidget(Supplier, "supplier")
+        column_name="supplier",
+        attribute="supplier",
+        widget=CachedForeignKeyWidget(Supplier, "supplier"),
     )
     utility = fields.Field(
-        column_name="utility", attribute="utility", widget=ForeignKeyWidget(Utility, "utility")
+        column_name="utility",
+        attribute="utility",
+        widget=CachedForeignKeyWidget(Utility, "utility"),
     )
     future_supplier = fields.Field(
         column_name="future_supplier",
         attribute="future_supplier",
-        widget=ForeignKeyWidget(Supplier, "supplier"),
+        widget=CachedForeignKeyWidget(Supplier, "supplier"),
     )
 
     class Meta:
         model = Contract
         report_skipped = True
         import_id_fields = ("id",)
+        use_bulk = True
+        # Large enough to keep the round trips down, small enough that a failed batch
+        # and the parameters of one statement stay manageable.
+        batch_size = 1000
+        # Derived from mpan_mpr on save.
+        exclude = ("mpan_key",)
         export_order = (
             "id",
             "contract_type",
@@ -171,3 +199,122 @@ class ContractResource(resources.ModelResource):
             "future_unit_rate_3",
             "future_standing_charge",
         )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.existing_instances = None
+        self.bands = None
+        self.account_manager_ids = set()
+        self.client_ids = set()
+        self.import_user = None
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        """Load the existing contracts and commission bands of the rows."""
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        self.import_user = kwargs.get("user")
+
+        id_field = self.fields["id"]
+        ids = set()
+        if id_field.column_name in dataset.headers:
+            for value in dataset[id_field.column_name]:
+                try:
+                    ids.add(id_field.widget.clean(value))
+                except ValueError:
+                    # Reported against its row by get_instance.
+                    pass
+        self.existing_instances = Contract.objects.in_bulk(ids - {None})
+        # The counters of the account managers contracts may be moved away from.
+        self.account_manager_ids = {
+            contract.client.account_manager_id for contract in self.existing_instances.values()
+        }
+
+        clients = Q(pk__in={contract.client_id for contract in self.existing_instances.values()})
+        client_column = self.fields["client"].column_name
+        if client_column in dataset.headers:
+            clients |= Q(client__in={name for name in dataset[client_column] if name})
+        self.bands = CommissionBandIndex.load(Client.objects.filter(clients).values("pk"))
+
+    def get_instance(self, instance_loader, row):
+        if self.existing_instances is None:
+            return super().get_instance(instance_loader, row)
+        id_field = self.fields["id"]
+        if id_field.column_name not in row:
+            return None
+        return self.existing_instances.get(id_field.clean(row))
+
+    def before_save_instance(self, instance, using_transactions, dry_run):
+        if not self.replaying:
+            self.apply_save_rules(instance)
+        self.client_ids.add(instance.client_id)
+        super().before_save_instance(instance, using_transactions, dry_run)
+
+    def apply_save_rules(self, instance):
+        """
+        Apply the rules of Contract.save() and its pre_save signals, which bulk writes
+        bypass, as BulkContractWriter.build_contract does.
+        """
+        for field in Contract._meta.concrete_fields:
+            if field.is_relation and not field.null and getattr(instance, field.attname) is None:
+                raise ValidationError({field.name: field.error_messages["null"]})
+
+        # Mirrors the update_directors_approval_date pre_save signal.
+        if instance._state.adding:
+            if instance.is_directors_approval == Contract.BaseYesNo.YES:
+                instance.directors_approval_date = timezone.now()
+        elif instance.has_changed("is_directors_approval"):
+            instance.directors_approval_date = timezone.now()
+
+        instance.update_mpan_key()
+        if self.bands is None:
+            instance.calculate_commission()
+        else:
+            self.bands.apply(instance, instance.utility.utility)
+        instance.validate_vat_declaration()
+        # Foreign keys come from the widgets as saved instances and the id is checked
+        # by the database, so the validation queries of a full clean are skipped.
+        instance.clean_for_save(Contract.Validation.LIGHT)
+
+    def get_bulk_update_fields(self):
+        return super().get_bulk_update_fields() + ["mpan_key"]
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # As ModelResource.bulk_create, with the history records written alongside.
+        try:
+            if self.create_instances and (using_transactions or not dry_run):
+                bulk_create_with_history(
+                    self.create_instances,
+                    Contract,
+                    batch_size=batch_size,
+                    default_user=self.import_user,
+                )
+        except Exception as e:
+            self.handle_import_error(result, e, raise_errors)
+        finally:
+            self.create_instances.clear()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # As ModelResource.bulk_update, with the history records written alongside.
+        try:
+            if self.update_instances and (using_transactions or not dry_run):
+                bulk_update_with_history(
+                    self.update_instances,
+                    Contract,
+                    self.get_bulk_update_fields(),
+                    batch_size=batch_size,
+                    default_user=self.import_user,
+                )
+        except Exception as e:
+            self.handle_import_error(result, e, raise_errors)
+        finally:
+            self.update_instances.clear()
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+        # The statistics signals do not fire for bulk writes.
+        if not dry_run:
+            self.account_manager_ids.update(
+                Client.objects.filter(pk__in=self.client_ids).values_list(
+                    "account_manager_id", flat=True
+                )
+            )
+            rebuild_contract_stats(self.account_manager_ids - {None})
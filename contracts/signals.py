@@ -1,25 +1,118 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from clients.models import Client
 from contracts.models import Contract
 from django.utils import timezone
+from utilities.models import Supplier, Utility
+
+from .stats import (
+    contract_state,
+    invalidate_contract_stats,
+    state_has_changed,
+    stored_contract_state,
+    record_client_change,
+    record_contract_change,
+    update_contracts,
+)
+
+
+@receiver(pre_save, sender=Client)
+def capture_client_state(sender, instance, **kwargs):
+    instance._stats_state = None
+    if instance.pk:
+        try:
+            instance._stats_state = dict(instance.get_loaded_values())
+        except Client.DoesNotExist:
+            pass
+
+
+# Registered before update_contracts_status so a client moving to another account manager
+# takes its contract counters along before their status changes.
+@receiver(post_save, sender=Client)
+def record_client_save(sender, instance, **kwargs):
+    new_state = {"account_manager_id": instance.account_manager_id, "is_lost": instance.is_lost}
+    record_client_change(instance, getattr(instance, "_stats_state", None), new_state)
+    instance._stats_state = None
 
 
 @receiver(post_save, sender=Client)
 def update_contracts_status(sender, instance, **kwargs):
     if instance.is_lost and instance.export_confirmed:
-        instance.client_contracts.update(contract_status="LOST")
+        update_contracts(instance.client_contracts.all(), contract_status="LOST")
 
 
 @receiver(pre_save, sender=Contract)
 def update_directors_approval_date(sender, instance, **kwargs):
     if instance.pk:  # Check if this is an existing instance
         try:
-            old_instance = Contract.objects.get(pk=instance.pk)
-            if old_instance.is_directors_approval != instance.is_directors_approval:
+            if instance.has_changed("is_directors_approval"):
                 instance.directors_approval_date = timezone.now()
         except Contract.DoesNotExist:
             pass  # Handle case where instance doesn't exist yet
     else:  # This is a new instance
         if instance.is_directors_approval == Contract.BaseYesNo.YES:
             instance.directors_approval_date = timezone.now()
+
+
+# Contract statistics maintenance -------------------------------------------------------
+
+
+@receiver(pre_save, sender=Contract)
+def capture_contract_state(sender, instance, **kwargs):
+    # The stored state comes from the tracked values loaded with the contract, and saves
+    # leaving every counted value as it was do not touch the counters at all.
+    instance._stats_state = None
+    instance._stats_unchanged = False
+    if not instance._state.adding:
+        try:
+            if state_has_changed(instance):
+                instance._stats_state = stored_contract_state(instance)
+            else:
+                instance._stats_unchanged = True
+        except Contract.DoesNotExist:
+            pass
+
+
+@receiver(post_save, sender=Contract)
+def record_contract_save(sender, instance, **kwargs):
+    if not getattr(instance, "_stats_unchanged", False):
+        record_contract_change(getattr(instance, "_stats_state", None), contract_state(instance))
+    instance._stats_state = None
+    instance._stats_unchanged = False
+
+
+@receiver(post_delete, sender=Contract)
+def record_contract_delete(sender, instance, origin=None, **kwargs):
+    # Contracts deleted along with their client, utility or supplier are accounted for
+    # by the handlers of the object being deleted.
+    if origin is not None and getattr(origin, "model", type(origin)) is not Contract:
+        return
+    record_contract_change(contract_state(instance), None)
+
+
+@receiver(pre_delete, sender=Client)
+def record_client_delete(sender, instance, **kwargs):
+    old_state = {"account_manager_id": instance.account_manager_id, "is_lost": instance.is_lost}
+    record_client_change(instance, old_state, None)
+
+
+@receiver([post_save, pre_delete], sender=Utility)
+def invalidate_utility_stats(sender, instance, created=False, **kwargs):
+    # Counters are keyed by utility name, so renames and deletes rebuild them on next read.
+    if not created:
+        invalidate_contract_stats(
+            Client.objects.filter(client_contracts__utility=instance).values("account_manager_id")
+        )
+
+
+@receiver([post_save, pre_delete], sender=Supplier)
+def invalidate_supplier_stats(sender, instance, created=False, **kwargs):
+    # Counters are keyed by supplier name, so renames and deletes rebuild them on next read.
+    if not created:
+        invalidate_contract_stats(
+            Client.objects.filter(
+                Q(client_contracts__supplier=instance)
+                | Q(client_contracts__future_supplier=instance)
+            ).values("account_manager_id")
+        )
@@ -0,0 +1,359 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from clients.models import Client
+from utilities.models import Supplier, Utility
+
+from .models import Contract, ContractStatistics
+
+# Contracts ending before this date are reported as expired on the dashboard.
+EXPIRED_BEFORE = date(2024, 1, 1)
+
+# (counter name, contract field, possible values) for every fixed-choice breakdown.
+CHOICE_DIMENSIONS = (
+    ("status", "contract_status", Contract.ContractStatus.values),
+    ("type", "contract_type", Contract.ContractType.values),
+    ("directors_approval", "is_directors_approval", Contract.BaseYesNo.values),
+    ("ooc", "is_ooc", Contract.BaseYesNo.values),
+)
+
+# Contract fields whose own value is part of the counter state.
+STATE_VALUE_FIELDS = (
+    "contract_status",
+    "contract_type",
+    "is_directors_approval",
+    "is_ooc",
+    "contract_end_date",
+)
+
+
+def count_contracts(contracts):
+    """
+    Compute the contract counters for a queryset of contracts.
+
+    The fixed-choice counters are resolved with a single conditional aggregation and
+    the utility and supplier breakdowns with one grouped query, so the cost does not
+    grow with the number of counters.
+
+    Returns:
+        dict: A JSON serialisable mapping of counter names to counts.
+    """
+    aggregates = {
+        "total": Count("id"),
+        "expired": Count("id", filter=Q(contract_end_date__lt=EXPIRED_BEFORE)),
+    }
+    aliases = {}
+    for name, field, values in CHOICE_DIMENSIONS:
+        for index, value in enumerate(values):
+            alias = f"{name}_{index}"
+            aliases[alias] = (name, value)
+            aggregates[alias] = Count("id", filter=Q(**{field: value}))
+    totals = contracts.aggregate(**aggregates)
+
+    counts = {
+        "total": totals["total"],
+        "expired": totals["expired"],
+        "utility": {},
+        "supplier": {},
+    }
+    for name, _field, _values in CHOICE_DIMENSIONS:
+        counts[name] = {}
+    for alias, (name, value) in aliases.items():
+        counts[name][value] = totals[alias]
+
+    breakdown = (
+        contracts.values("utility__utility", "supplier__supplier")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in breakdown:
+        utility, supplier = row["utility__utility"], row["supplier__supplier"]
+        counts["utility"][utility] = counts["utility"].get(utility, 0) + row["count"]
+        counts["supplier"][supplier] = counts["supplier"].get(supplier, 0) + row["count"]
+    return counts
+
+
+def compute_contract_counts(account_manager_id):
+    """
+    Compute every dashboard counter for an account manager straight from the contract table.
+
+    Returns:
+        dict: The contract counters plus the active and lost client counters.
+    """
+    counts = count_contracts(Contract.objects.filter(client__account_manager_id=account_manager_id))
+    counts["clients"] = Client.objects.filter(account_manager_id=account_manager_id).aggregate(
+        active=Count("id", filter=Q(is_lost=False)),
+        lost=Count("id", filter=Q(is_lost=True)),
+    )
+    return counts
+
+
+# Incremental maintenance ---------------------------------------------------------------
+
+
+def counter_keys(state):
+    """Returns the counter keys a contract in the given state contributes one to."""
+    end_date = Contract._meta.get_field("contract_end_date").to_python(state["contract_end_date"])
+    keys = [
+        ("total",),
+        ("status", state["contract_status"]),
+        ("type", state["contract_type"]),
+        ("directors_approval", state["is_directors_approval"]),
+        ("ooc", state["is_ooc"]),
+        ("utility", state["utility__utility"]),
+        ("supplier", state["supplier__supplier"]),
+    ]
+    if end_date is not None and end_date < EXPIRED_BEFORE:
+        keys.append(("expired",))
+    return keys
+
+
+def flatten_counts(counts):
+    """Returns the counter keys and values of a nested counts mapping."""
+    flat = Counter()
+    for name, value in counts.items():
+        if isinstance(value, dict):
+            for key, count in value.items():
+                flat[(name, key)] += count
+        else:
+            flat[(name,)] += value
+    return flat
+
+
+def state_has_changed(contract):
+    """Returns whether any value the counters depend on differs from its stored value."""
+    return any(contract.has_changed(name) for name in Contract.tracked_fields)
+
+
+def stored_contract_state(contract):
+    """
+    Returns the counter state of a saved contract from its tracked stored values.
+
+    The account manager, utility and supplier of a relation that is unchanged are
+    read from the contract's related objects; only a changed relation is looked up.
+    """
+    loaded = contract.get_loaded_values()
+    state = {field: loaded[field] for field in STATE_VALUE_FIELDS}
+    related = (
+        ("client", "client__account_manager_id", Client, "account_manager_id"),
+        ("utility", "utility__utility", Utility, "utility"),
+        ("supplier", "supplier__supplier", Supplier, "supplier"),
+    )
+    for field, key, model, column in related:
+        if contract.has_changed(field):
+            state[key] = (
+                model.objects.filter(pk=loaded[f"{field}_id"])
+                .values_list(column, flat=True)
+                .first()
+            )
+        else:
+            state[key] = getattr(getattr(contract, field), column)
+    return state
+
+
+def contract_state(contract):
+    """Returns the counter state of an in-memory contract."""
+    return {
+        "client__account_manager_id": contract.client.account_manager_id,
+        "contract_status": contract.contract_status,
+        "contract_type": contract.contract_type,
+        "is_directors_approval": contract.is_directors_approval,
+        "is_ooc": contract.is_ooc,
+        "utility__utility": contract.utility.utility,
+        "supplier__supplier": contract.supplier.supplier,
+        "contract_end_date": contract.contract_end_date,
+    }
+
+
+def apply_deltas(deltas):
+    """
+    Adjust the stored counters by the given amounts.
+
+    Args:
+        deltas: A mapping of account manager id to a Counter of counter keys.
+
+    Managers without a statistics row are skipped; their row is computed from scratch
+    on the next read, which already includes the change.
+    """
+    deltas = {manager_id: delta for manager_id, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+    with transaction.atomic():
+        rows = ContractStatistics.objects.select_for_update().filter(pk__in=deltas.keys())
+        for row in rows:
+            for key, amount in deltas[row.pk].items():
+                if len(key) == 1:
+                    row.counts[key[0]] = row.counts.get(key[0], 0) + amount
+                else:
+                    bucket = row.counts.setdefault(key[0], {})
+                    bucket[key[1]] = bucket.get(key[1], 0) + amount
+            row.save(update_fields=["counts", "updated_at"])
+
+
+def record_contract_change(old_state=None, new_state=None):
+    """Apply the counter changes of a contract moving from old_state to new_state."""
+    deltas = defaultdict(Counter)
+    if old_state is not None:
+        for key in counter_keys(old_state):
+            deltas[old_state["client__account_manager_id"]][key] -= 1
+    if new_state is not None:
+        for key in counter_keys(new_state):
+            deltas[new_state["client__account_manager_id"]][key] += 1
+    apply_deltas(deltas)
+
+
+def record_client_change(client, old_state=None, new_state=None):
+    """
+    Apply the counter changes of a client being created, edited or deleted.
+
+    The states are dicts of the client's ``account_manager_id`` and ``is_lost`` values.
+    Moving a client to another account manager moves all of its contract counters.
+    """
+    deltas = defaultdict(Counter)
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is not None:
+            bucket = "lost" if state["is_lost"] else "active"
+            deltas[state["account_manager_id"]][("clients", bucket)] += sign
+
+    moved = (
+        old_state is not None
+        and new_state is not None
+        and old_state["account_manager_id"] != new_state["account_manager_id"]
+    )
+    if moved or new_state is None:
+        contract_counts = flatten_counts(count_contracts(client.client_contracts.all()))
+        deltas[old_state["account_manager_id"]].subtract(contract_counts)
+        if new_state is not None:
+            deltas[new_state["account_manager_id"]].update(contract_counts)
+    apply_deltas(deltas)
+
+
+def update_contracts(queryset, **values):
+    """
+    Bulk update contracts like ``queryset.update(**values)`` while keeping the counters in step.
+
+    The counters affected by the update are read with one grouped query before the
+    update and moved across in one pass afterwards.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    fields = [field for _name, field, _values in CHOICE_DIMENSIONS if field in values]
+    if not fields:
+        return queryset.update(**values)
+
+    names = {field: name for name, field, _values in CHOICE_DIMENSIONS}
+    with transaction.atomic():
+        groups = list(
+            queryset.values("client__account_manager_id", *fields)
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        updated = queryset.update(**values)
+        deltas = defaultdict(Counter)
+        for group in groups:
+            delta = deltas[group["client__account_manager_id"]]
+            for field in fields:
+                delta[(names[field], group[field])] -= group["count"]
+                delta[(names[field], values[field])] += group["count"]
+        apply_deltas(deltas)
+    return updated
+
+
+def invalidate_contract_stats(account_managers):
+    """Drop the stored counters of the given account managers so they are rebuilt on read."""
+    ContractStatistics.objects.filter(account_manager__in=account_managers).delete()
+
+
+def rebuild_contract_stats(account_manager_ids):
+    """Recompute and store the counters of the given account managers from scratch."""
+    for account_manager_id in account_manager_ids:
+        ContractStatistics.objects.update_or_create(
+            account_manager_id=account_manager_id,
+            defaults={"counts": compute_contract_counts(account_manager_id)},
+        )
+
+
+def get_contract_counts(account_manager_id):
+    """Returns the stored counters of an account manager, computing them on first use."""
+    counts = (
+        ContractStatistics.objects.filter(pk=account_manager_id)
+        .values_list("counts", flat=True)
+        .first()
+    )
+    if counts is None:
+        counts = compute_contract_counts(account_manager_id)
+        ContractStatistics.objects.bulk_create(
+            [ContractStatistics(account_manager_id=account_manager_id, counts=counts)],
+            ignore_conflicts=True,
+        )
+    return counts
+
+
+class ContractStats:
+    """
+    Read-only view over the dashboard counters of a single account manager.
+
+    Use ``ContractStats.for_user(user)`` to load the counters; every accessor is
+    then a dictionary lookup and never touches the database.
+    """
+
+    def __init__(self, counts):
+        self.counts = counts
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(get_contract_counts(user.pk))
+
+    @property
+    def total_contracts(self):
+        return self.counts["total"]
+
+    @property
+    def expired_contracts(self):
+        return self.counts["expired"]
+
+    @property
+    def active_clients(self):
+        return self.counts["clients"]["active"]
+
+    @property
+    def lost_clients(self):
+        return self.counts["clients"]["lost"]
+
+    @property
+    def by_status(self):
+        return self.counts["status"]
+
+    @property
+    def by_type(self):
+        return self.counts["type"]
+
+    @property
+    def by_utility(self):
+        return self.counts["utility"]
+
+    @property
+    def by_supplier(self):
+        return self.counts["supplier"]
+
+    def contracts_by_status(self, contract_status):
+        return self.counts["status"].get(contract_status, 0)
+
+    def contracts_by_type(self, contract_type):
+        return self.counts["type"].get(contract_type, 0)
+
+    def contracts_by_utility(self, utility_type):
+        return self.counts["utility"].get(utility_type, 0)
+
+    def contracts_by_supplier(self, supplier_name):
+        return self.counts["supplier"].get(supplier_name, 0)
+
+    def directors_approval(self, is_directors_approval):
+        return self.counts["directors_approval"].get(is_directors_approval, 0)
+
+    def out_of_contract(self, is_ooc):
+        return self.counts["ooc"].get(is_ooc, 0)
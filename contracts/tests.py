@@ -1,5 +1,55 @@
-from django.test import TestCase
-from contracts.models import Contract, ContractsManager
+import csv
+import importlib
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from unittest import mock
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+import openpyxl
+import tablib
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from commissions.models import GasCommission
+from contracts.admin_actions import (
+    export_commissions_to_excel,
+    export_live_duplicates,
+    export_expired_contracts,
+)
+from contracts.custom_search import CustomSearchAdmin
+from contracts.exports import write_excel_and_pdfs
+from contracts.filters import AccountManagerFilter
+from contracts.importer import IMPORT_ORDER, file_checksum
+from contracts.jobs import STALE_JOB_ERROR, STALE_JOB_TIMEOUT, claim_next_job, enqueue_export
+from contracts.resources import ContractResource
+from core.resources import CachedForeignKeyWidget
+from contracts.models import (
+    Contract,
+    ContractsManager,
+    ContractStatistics,
+    ExportJob,
+    ImportCheckpoint,
+    normalise_mpan,
+)
+from contracts.stats import (
+    ContractStats,
+    compute_contract_counts,
+    flatten_counts,
+    rebuild_contract_stats,
+    update_contracts,
+)
 from clients.models import Client
 from utilities.models import Supplier, Utility
 from users.models import AccountManager
@@ -47,3 +97,1022 @@ class ContractsManagerTestCase(TestCase):
         self.assertEqual(contract_with_related.utility, self.utility)
         self.assertEqual(contract_with_related.mpan_mpr, "1234567890123")
         self.assertEqual(contract_with_related.business_name, "The White House")
+
+
+class ContractStatisticsTestCase(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.other_manager = AccountManager.objects.create(email="manager2@example.com")
+        self.client = Client.objects.create(client="Client1", account_manager=self.account_manager)
+        self.supplier = Supplier.objects.create(supplier="Supplier1")
+        self.utility = Utility.objects.create(utility="Utility1")
+        self.contract = Contract.objects.create(
+            client=self.client,
+            supplier=self.supplier,
+            utility=self.utility,
+            mpan_mpr="1234567890123",
+            business_name="The White House",
+        )
+        rebuild_contract_stats([self.account_manager.pk, self.other_manager.pk])
+
+    def assertStatsUpToDate(self):
+        for account_manager in (self.account_manager, self.other_manager):
+            stored = ContractStatistics.objects.get(pk=account_manager.pk).counts
+            expected = compute_contract_counts(account_manager.pk)
+            self.assertEqual(
+                {key: count for key, count in flatten_counts(stored).items() if count},
+                {key: count for key, count in flatten_counts(expected).items() if count},
+            )
+
+    def test_contract_save_and_delete(self):
+        contract = Contract.objects.create(
+            client=self.client,
+            supplier=self.supplier,
+            utility=self.utility,
+            mpan_mpr="2",
+            business_name="Site 2",
+            contract_end_date=date(2023, 1, 1),
+        )
+        self.assertStatsUpToDate()
+        self.assertEqual(ContractStats.for_user(self.account_manager).total_contracts, 2)
+
+        contract.contract_status = Contract.ContractStatus.PRICING
+        contract.is_ooc = Contract.BaseYesNo.YES
+        contract.save()
+        self.assertStatsUpToDate()
+
+        contract.delete()
+        self.assertStatsUpToDate()
+
+    def test_saves_read_the_stored_state_from_the_tracked_values(self):
+        statistics_table = ContractStatistics._meta.db_table
+        contract = Contract.objects.get(pk=self.contract.pk)
+        contract.business_name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            contract.save()
+        self.assertFalse([query for query in queries if statistics_table in query["sql"]])
+
+        contract.contract_status = Contract.ContractStatus.PRICING
+        with CaptureQueriesContext(connection) as queries:
+            # Light validation leaves out the unique check, which reads the table too.
+            contract.save(validation=Contract.Validation.LIGHT)
+        contract_reads = [
+            query
+            for query in queries
+            if query["sql"].startswith("SELECT") and "client_contracts" in query["sql"]
+        ]
+        self.assertFalse(contract_reads)
+        self.assertStatsUpToDate()
+
+        contract.client = Client.objects.create(
+            client="Client2", account_manager=self.other_manager
+        )
+        contract.utility = Utility.objects.create(utility="Utility2")
+        contract.save()
+        self.assertStatsUpToDate()
+
+    def test_update_contracts(self):
+        update_contracts(Contract.objects.all(), contract_status="LOCKED", is_ooc="YES")
+        self.assertStatsUpToDate()
+        self.assertEqual(
+            ContractStats.for_user(self.account_manager).contracts_by_status("LOCKED"), 1
+        )
+
+    def test_client_moved_and_lost(self):
+        self.client.account_manager = self.other_manager
+        self.client.save()
+        self.assertStatsUpToDate()
+        self.assertEqual(ContractStats.for_user(self.other_manager).total_contracts, 1)
+
+        self.client.is_lost = True
+        self.client.export_confirmed = True
+        self.client.save()
+        self.assertStatsUpToDate()
+        self.assertEqual(ContractStats.for_user(self.other_manager).contracts_by_status("LOST"), 1)
+
+        self.client.delete()
+        self.assertStatsUpToDate()
+
+    def test_rebuild_command_verify(self):
+        ContractStatistics.objects.filter(pk=self.account_manager.pk).update(counts={"total": 5})
+        output = StringIO()
+        call_command("rebuild_contract_stats", "--verify", stdout=output)
+        self.assertIn("1 account managers have stale statistics", output.getvalue())
+
+        call_command("rebuild_contract_stats", stdout=StringIO())
+        self.assertStatsUpToDate()
+
+
+class BulkImportTestCase(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.client = Client.objects.create(client="Client1", account_manager=self.account_manager)
+        self.supplier = Supplier.objects.create(supplier="Supplier1")
+        self.utility = Utility.objects.create(utility="Utility1")
+        self.contract = Contract.objects.create(
+            client=self.client,
+            supplier=self.supplier,
+            utility=self.utility,
+            mpan_mpr="1234567890123",
+            business_name="The White House",
+        )
+        GasCommission.objects.create(
+            client=self.client,
+            eac_from=Decimal("0"),
+            eac_to=Decimal("5000"),
+            commission_per_annum=Decimal("120.00"),
+            commission_per_unit=Decimal("0.005"),
+        )
+        rebuild_contract_stats([self.account_manager.pk])
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # The command writes its error log to the working directory.
+        cwd = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def sheet_rows(self, rows):
+        # Columns left out of a row get the model default, like a fully filled in sheet.
+        defaults = {
+            field.name: field.get_default()
+            for field in Contract._meta.concrete_fields
+            if field.has_default()
+        }
+        yield IMPORT_ORDER
+        for values in rows:
+            yield [values.get(field, defaults.get(field)) for field in IMPORT_ORDER]
+
+    def write_sheet(self, rows):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        for row in self.sheet_rows(rows):
+            sheet.append(row)
+        workbook.save("contracts.xlsx")
+        return "contracts.xlsx"
+
+    def write_csv(self, rows):
+        with open("contracts.csv", "w", newline="") as csvfile:
+            csv.writer(csvfile).writerows(self.sheet_rows(rows))
+        return "contracts.csv"
+
+    def test_bulk_import(self):
+        file_path = self.write_sheet(
+            [
+                {
+                    "id": self.contract.id,
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Utility1",
+                    "mpan_mpr": "1234567890123",
+                    "business_name": "The White House",
+                    "contract_status": "LOCKED",
+                    "contract_end_date": "31/12/2023",
+                },
+                {
+                    "client": "Client1",
+                    "supplier": "Supplier2",
+                    "utility": "Gas",
+                    "mpan_mpr": "2",
+                    "business_name": "Site 2",
+                    "eac": "1500",
+                    "is_directors_approval": "YES",
+                },
+                {
+                    "client": "Unknown",
+                    "supplier": "Supplier1",
+                    "utility": "Gas",
+                    "mpan_mpr": "3",
+                    "business_name": "Site 3",
+                },
+            ]
+        )
+        output = StringIO()
+        call_command("import_contracts", file_path, "--bulk", "--batch-size", "2", stdout=output)
+        self.assertIn("Created 1 and updated 1 records", output.getvalue())
+        self.assertIn("client 'Unknown' does not exist", output.getvalue())
+        self.assertTrue(os.path.exists("import_errors.csv"))
+
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.contract_status, "LOCKED")
+        self.assertEqual(self.contract.contract_end_date, date(2023, 12, 31))
+        self.assertEqual(self.contract.history.count(), 2)
+
+        new_contract = Contract.objects.get(mpan_mpr="2")
+        self.assertEqual(new_contract.mpan_key, "2")
+        self.assertEqual(new_contract.supplier.supplier, "Supplier2")
+        self.assertEqual(new_contract.commission_per_annum, Decimal("120.00"))
+        self.assertIsNotNone(new_contract.directors_approval_date)
+        self.assertEqual(new_contract.history.count(), 1)
+
+        stats = ContractStats.for_user(self.account_manager)
+        self.assertEqual(stats.total_contracts, 2)
+        self.assertEqual(stats.expired_contracts, 1)
+
+        # The sequence continues after the imported ids.
+        contract = Contract.objects.create(
+            client=self.client,
+            supplier=self.supplier,
+            utility=self.utility,
+            mpan_mpr="4",
+            business_name="Site 4",
+        )
+        self.assertGreater(contract.id, new_contract.id)
+
+    def test_csv_import(self):
+        file_path = self.write_csv(
+            [
+                {
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Gas",
+                    "mpan_mpr": "2",
+                    "business_name": "Site 2",
+                    "eac": "1500",
+                    "contract_end_date": "01/06/2026",
+                }
+            ]
+        )
+        output = StringIO()
+        call_command("import_contracts", file_path, "--bulk", stdout=output)
+        self.assertIn("Created 1 and updated 0 records", output.getvalue())
+
+        contract = Contract.objects.get(mpan_mpr="2")
+        self.assertEqual(contract.contract_end_date, date(2026, 6, 1))
+        self.assertEqual(contract.commission_per_annum, Decimal("120.00"))
+        # Empty cells are read as blanks rather than empty strings.
+        self.assertIsNone(contract.future_supplier)
+        self.assertIsNone(contract.lock_in_date)
+
+    def test_resume_from_checkpoint(self):
+        file_path = self.write_sheet(
+            [
+                {
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Utility1",
+                    "mpan_mpr": str(mpan),
+                    "business_name": f"Site {mpan}",
+                }
+                for mpan in range(2, 7)
+            ]
+        )
+        # A previous run committed the rows up to sheet row 3 before stopping.
+        ImportCheckpoint.objects.create(
+            file_hash=file_checksum(file_path), file_name=file_path, last_row=3
+        )
+
+        output = StringIO()
+        call_command("import_contracts", file_path, "--resume", "--chunk-size", "2", stdout=output)
+        self.assertIn("Resuming after row 3", output.getvalue())
+        self.assertEqual(
+            sorted(
+                Contract.objects.exclude(pk=self.contract.pk).values_list("mpan_mpr", flat=True)
+            ),
+            ["4", "5", "6"],
+        )
+        checkpoint = ImportCheckpoint.objects.get(file_hash=file_checksum(file_path))
+        self.assertEqual(checkpoint.last_row, 6)
+        self.assertTrue(checkpoint.is_completed)
+
+        output = StringIO()
+        call_command("import_contracts", file_path, "--resume", stdout=output)
+        self.assertIn("has already been imported", output.getvalue())
+        self.assertEqual(Contract.objects.count(), 4)
+
+    def test_failed_row_does_not_abort_chunk(self):
+        file_path = self.write_sheet(
+            [
+                {
+                    "id": self.contract.id,
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Utility1",
+                    "mpan_mpr": "1234567890123",
+                    "business_name": "The White House",
+                    "vat_rate": "Bogus",
+                },
+                {
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Utility1",
+                    "mpan_mpr": "2",
+                    "business_name": "Site 2",
+                },
+            ]
+        )
+        output = StringIO()
+        call_command("import_contracts", file_path, stdout=output)
+        self.assertIn("Error processing record in row 2", output.getvalue())
+        self.assertTrue(Contract.objects.filter(mpan_mpr="2").exists())
+
+    def test_parallel_parsing(self):
+        file_path = self.write_sheet(
+            [
+                {
+                    "client": "Client1",
+                    "supplier": "Supplier1",
+                    "utility": "Gas",
+                    "mpan_mpr": str(mpan),
+                    "business_name": f"Site {mpan}",
+                    "eac": "1500",
+                    "contract_end_date": "01-06-2026",
+                    "contract_status": "BOGUS" if mpan == 3 else "LIVE",
+                }
+                for mpan in range(2, 6)
+            ]
+        )
+        output = StringIO()
+        call_command(
+            "import_contracts",
+            file_path,
+            "--bulk",
+            "--workers",
+            "2",
+            "--chunk-size",
+            "2",
+            stdout=output,
+        )
+        self.assertIn("Error processing record in row 3: contract_status", output.getvalue())
+        self.assertIn("Created 3 and updated 0 records", output.getvalue())
+
+        contracts = Contract.objects.exclude(pk=self.contract.pk).order_by("mpan_mpr")
+        self.assertEqual([contract.mpan_mpr for contract in contracts], ["2", "4", "5"])
+        self.assertEqual(contracts[0].contract_end_date, date(2026, 6, 1))
+        self.assertEqual(contracts[0].commission_per_annum, Decimal("120.00"))
+
+
+class RecalculateCommissionsTestCase(TestCase):
+    def setUp(self):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.client = Client.objects.create(client="Client1", account_manager=account_manager)
+        other_client = Client.objects.create(client="Client2", account_manager=account_manager)
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        gas = Utility.objects.create(utility="Gas")
+        self.band = GasCommission.objects.create(
+            client=self.client,
+            eac_from=Decimal("0"),
+            eac_to=Decimal("5000"),
+            commission_per_annum=Decimal("120.00"),
+            commission_per_unit=Decimal("0.005"),
+        )
+        for client, mpan, eac in (
+            (self.client, "1", "1000"),
+            (self.client, "2", "9000"),
+            (other_client, "3", "1000"),
+        ):
+            Contract.objects.create(
+                client=client,
+                supplier=supplier,
+                utility=gas,
+                mpan_mpr=mpan,
+                business_name=f"Site {mpan}",
+                eac=Decimal(eac),
+            )
+
+    def test_recalculate_commissions_command(self):
+        GasCommission.objects.filter(pk=self.band.pk).update(commission_per_annum=Decimal("150"))
+
+        output = StringIO()
+        call_command("recalculate_commissions", "--client", "Client1", stdout=output)
+        self.assertIn("Updated the commission of 1 contracts", output.getvalue())
+
+        contract = Contract.objects.get(mpan_mpr="1")
+        self.assertEqual(contract.commission_per_annum, Decimal("150"))
+        self.assertEqual(contract.history.count(), 2)
+        # Out of every band, so the rates are left alone.
+        self.assertIsNone(Contract.objects.get(mpan_mpr="2").commission_per_annum)
+
+        # Nothing left to change.
+        output = StringIO()
+        call_command("recalculate_commissions", stdout=output)
+        self.assertIn("Updated the commission of 0 contracts", output.getvalue())
+
+
+class ExcelExportTestCase(TestCase):
+    def setUp(self):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        client = Client.objects.create(client="Client1", account_manager=account_manager)
+        corona = Supplier.objects.create(supplier="Corona")
+        gas = Utility.objects.create(utility="Gas")
+        for mpan, end_date in (("1", date(2023, 1, 31)), ("2", date(2030, 1, 31))):
+            for _ in range(2):
+                Contract.objects.create(
+                    client=client,
+                    supplier=corona,
+                    utility=gas,
+                    mpan_mpr=mpan,
+                    business_name=f"Site {mpan}",
+                    contract_end_date=end_date,
+                    is_ooc="YES",
+                    eac=Decimal("1000.00"),
+                )
+
+    def read_response(self, response):
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content)
+        worksheet = openpyxl.load_workbook(BytesIO(content)).active
+        return worksheet.title, list(worksheet.iter_rows(values_only=True))
+
+    def test_commissions_export(self):
+        response = export_commissions_to_excel(None, None, Contract.objects.all())
+        self.assertIn("contract_commissions_by_client.xlsx", response["Content-Disposition"])
+        title, rows = self.read_response(response)
+        self.assertEqual(title, "Commissions by Client Contracts")
+        self.assertEqual(rows[0][0], "Client")
+        self.assertEqual([(row[7], row[11]) for row in rows[1:]], [("1", 2), ("2", 2)])
+
+    def test_expired_contracts_export(self):
+        _title, rows = self.read_response(
+            export_expired_contracts(None, None, Contract.objects.all())
+        )
+        self.assertEqual([row[2] for row in rows[1:]], ["1", "1"])
+        self.assertEqual(rows[1][4], "31/01/2023")
+
+    def test_live_duplicates_export(self):
+        # Same key columns, but another supplier, so not a duplicate of the others.
+        Contract.objects.create(
+            client=Client.objects.get(),
+            supplier=Supplier.objects.create(supplier="SSE"),
+            utility=Utility.objects.get(),
+            mpan_mpr="1",
+            business_name="Site 1",
+            contract_end_date=date(2023, 1, 31),
+        )
+        title, rows = self.read_response(
+            export_live_duplicates(None, None, Contract.objects.filter(mpan_mpr="1"))
+        )
+        self.assertEqual(title, "Live Duplicate Contracts")
+        self.assertEqual([(row[3], row[6]) for row in rows[1:]], [("1", "Corona")])
+
+    def test_find_duplicate_contracts_command(self):
+        output = StringIO()
+        call_command(
+            "find_duplicate_contracts", "--batch-size", "1", stdout=output, stderr=StringIO()
+        )
+        rows = list(csv.reader(StringIO(output.getvalue())))
+        self.assertEqual(rows[0][0], "ID")
+        self.assertEqual(sorted(row[3] for row in rows[1:]), ["1", "2"])
+
+        output = StringIO()
+        call_command(
+            "find_duplicate_contracts", "--supplier", "SSE", stdout=output, stderr=StringIO()
+        )
+        self.assertEqual(len(list(csv.reader(StringIO(output.getvalue())))), 1)
+
+
+class ExportJobTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser("admin@example.com", "password")
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        client = Client.objects.create(client="Client1", account_manager=account_manager)
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        utility = Utility.objects.create(utility="Utility1")
+        for mpan in ("1", "2"):
+            Contract.objects.create(
+                client=client,
+                supplier=supplier,
+                utility=utility,
+                mpan_mpr=mpan,
+                business_name=f"Site {mpan}",
+            )
+
+    def login(self):
+        # force_login would fire user_logged_in, whose login history receiver needs a
+        # real request, so the session is set up directly.
+        session = self.client.session
+        session[SESSION_KEY] = str(self.user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[-1]
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.save()
+
+    def test_large_export_is_queued_and_downloaded(self):
+        self.login()
+        with mock.patch("contracts.admin_actions.EXPORT_QUEUE_THRESHOLD", 1):
+            response = self.client.post(
+                reverse("admin:contracts_contract_changelist"),
+                {
+                    "action": "export_commissions_to_excel",
+                    "_selected_action": list(Contract.objects.values_list("pk", flat=True)),
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, ExportJob.Status.PENDING)
+        self.assertEqual(job.requested_by, self.user)
+
+        call_command("run_export_jobs", "--once", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.Status.DONE)
+
+        response = self.client.get(reverse("admin:contracts_exportjob_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        worksheet = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(worksheet.max_row, 3)
+
+    def test_stale_running_jobs_are_failed(self):
+        stale = enqueue_export(ExportJob.Kind.COMMISSIONS, Contract.objects.all(), self.user)
+        running = enqueue_export(ExportJob.Kind.COMMISSIONS, Contract.objects.all(), self.user)
+        ExportJob.objects.update(status=ExportJob.Status.RUNNING, started_at=timezone.now())
+        ExportJob.objects.filter(pk=stale.pk).update(
+            started_at=timezone.now() - STALE_JOB_TIMEOUT - timedelta(minutes=1)
+        )
+
+        self.assertIsNone(claim_next_job())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ExportJob.Status.FAILED)
+        self.assertEqual(stale.error, STALE_JOB_ERROR)
+        self.assertIsNotNone(stale.finished_at)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ExportJob.Status.RUNNING)
+
+    def test_excel_and_pdfs_job(self):
+        job = enqueue_export(ExportJob.Kind.EXCEL_AND_PDFS, Contract.objects.all(), self.user)
+        call_command("run_export_jobs", "--once", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.Status.DONE)
+        with job.file.open("rb") as file, zipfile.ZipFile(file) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()), ["data_1.pdf", "data_2.pdf", "exported_data.xlsx"]
+            )
+
+    def test_pdfs_rendered_in_process_pool(self):
+        buffer = BytesIO()
+        with mock.patch("contracts.exports.PARALLEL_PDF_THRESHOLD", 0):
+            with self.assertNumQueries(1):
+                write_excel_and_pdfs(Contract.objects.order_by("mpan_mpr"), buffer, workers=2)
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()), ["data_1.pdf", "data_2.pdf", "exported_data.xlsx"]
+            )
+            self.assertTrue(archive.read("data_2.pdf").startswith(b"%PDF"))
+            worksheet = openpyxl.load_workbook(BytesIO(archive.read("exported_data.xlsx"))).active
+            self.assertEqual(
+                [row[2] for row in worksheet.iter_rows(values_only=True)], ["mpan_mpr", "1", "2"]
+            )
+
+    def test_excel_and_pdfs_response_is_streamed(self):
+        self.login()
+        response = self.client.post(
+            reverse("admin:contracts_contract_changelist"),
+            {
+                "action": "export_to_excel_and_pdfs",
+                "_selected_action": list(Contract.objects.values_list("pk", flat=True)),
+            },
+        )
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # One piece per member plus the central directory.
+        self.assertEqual(len(chunks), 4)
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_download_of_pending_job(self):
+        job = enqueue_export(ExportJob.Kind.COMMISSIONS, Contract.objects.all(), self.user)
+        self.login()
+        response = self.client.get(reverse("admin:contracts_exportjob_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ContractIndexPlanTestCase(TestCase):
+    """
+    The hot contract queries must stay index driven.
+
+    Sequential scans are disabled so the planner picks an index whenever one
+    applies, which keeps the assertions independent of the tiny test table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        cls.contract_client = Client.objects.create(
+            client="Client1", account_manager=cls.account_manager
+        )
+        # Rows none of the tests look for, analysed so the plans do not depend on whether
+        # autovacuum has analysed the table since earlier tests wrote to it.
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        utility = Utility.objects.create(utility="Utility1")
+        Contract.objects.bulk_create(
+            Contract(
+                client=cls.contract_client,
+                supplier=supplier,
+                utility=utility,
+                business_name=f"Site {index}",
+                mpan_mpr=f"{9000000000000 + index}",
+                mpan_key=f"{9000000000000 + index}",
+                contract_status="LIVE",
+                contract_end_date=date(2031, 1, 1),
+            )
+            for index in range(1000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Contract._meta.db_table}")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_client_contracts_by_status(self):
+        self.assertUsesIndex(
+            Contract.objects.filter(client=self.contract_client, contract_status="LOST"),
+            "contract_client_status_idx",
+        )
+
+    def test_default_ordering(self):
+        self.assertUsesIndex(
+            Contract.objects.order_by("contract_end_date", "id")[:20], "contract_end_date_id_idx"
+        )
+
+    def test_live_contracts_ending_soon(self):
+        self.assertUsesIndex(
+            Contract.objects.filter(
+                contract_status="LIVE", contract_end_date__lte=date(2030, 1, 1)
+            ).order_by("contract_end_date")[:20],
+            "contract_live_end_date_idx",
+        )
+
+    def test_out_of_contract_expired(self):
+        self.assertUsesIndex(
+            Contract.objects.filter(is_ooc="YES", contract_end_date__lt=date(2024, 1, 1)),
+            "contract_ooc_end_date_idx",
+        )
+
+    def test_mpan_lookup(self):
+        self.assertUsesIndex(
+            Contract.objects.filter(mpan_mpr="1234567890123"), "client_cont_mpan_mp_131632_idx"
+        )
+
+    def test_search_words(self):
+        queryset, _ = site._registry[Contract].get_search_results(
+            RequestFactory().get("/"), Contract.objects.all(), "acme"
+        )
+        self.assertUsesIndex(queryset, "contract_search_vector_idx")
+
+    def test_search_meter_number(self):
+        queryset, _ = site._registry[Contract].get_search_results(
+            RequestFactory().get("/"), Contract.objects.all(), "1234567"
+        )
+        self.assertUsesIndex(queryset, "contract_mpan_prefix_idx")
+        self.assertUsesIndex(queryset, "contract_serial_prefix_idx")
+
+    def test_mpan_list(self):
+        queryset, _ = site._registry[Contract].get_search_results(
+            RequestFactory().get("/"), Contract.objects.all(), "1234567890123, 1234567890124"
+        )
+        self.assertUsesIndex(queryset, "contract_mpan_key_idx")
+
+    def test_redundant_indexes_are_gone(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Contract._meta.db_table)
+        single_column_indexes = [
+            constraint["columns"]
+            for constraint in constraints.values()
+            if constraint["index"]
+            and not constraint["primary_key"]
+            and len(constraint["columns"]) == 1
+        ]
+        self.assertNotIn(["client_id"], single_column_indexes)
+        self.assertNotIn(["mpan_mpr"], single_column_indexes)
+
+
+class ContractSearchTestCase(TestCase):
+    def setUp(self):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.acme = Client.objects.create(client="Acme Holdings", account_manager=account_manager)
+        other = Client.objects.create(client="Other", account_manager=account_manager)
+        supplier = Supplier.objects.create(supplier="British Gas")
+        utility = Utility.objects.create(utility="Electricity")
+        self.office = Contract.objects.create(
+            client=self.acme,
+            supplier=supplier,
+            utility=utility,
+            mpan_mpr="1200012345678",
+            meter_serial_number="E10BG0001",
+            business_name="Acme Head Office",
+            site_address="1 High Street, London",
+        )
+        self.warehouse = Contract.objects.create(
+            client=other,
+            supplier=Supplier.objects.create(supplier="EDF"),
+            utility=utility,
+            mpan_mpr="1900098765432",
+            business_name="Northern Warehouse",
+            client_group="Logistics Group",
+        )
+        self.model_admin = site._registry[Contract]
+
+    def search(self, term):
+        queryset, use_distinct = self.model_admin.get_search_results(
+            RequestFactory().get("/"), Contract.objects.all(), term
+        )
+        self.assertFalse(use_distinct)
+        return set(queryset)
+
+    def test_word_prefixes(self):
+        self.assertEqual(self.search("head off"), {self.office})
+        self.assertEqual(self.search("LONDON"), {self.office})
+        self.assertEqual(self.search("logistics"), {self.warehouse})
+        self.assertEqual(self.search('"high street"'), {self.office})
+
+    def test_related_names(self):
+        self.assertEqual(self.search("holdings"), {self.office})
+        self.assertEqual(self.search("british"), {self.office})
+        self.assertEqual(self.search("electric"), {self.office, self.warehouse})
+
+    def test_meter_numbers(self):
+        self.assertEqual(self.search("1200012"), {self.office})
+        self.assertEqual(self.search("e10bg"), {self.office})
+        self.assertEqual(self.search("12345678"), set())
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("electricity warehouse"), {self.warehouse})
+        self.assertEqual(self.search("acme warehouse"), set())
+
+    def test_mpan_key_is_normalised(self):
+        self.office.mpan_mpr = " 12 0001 2345 67a "
+        self.office.save()
+        self.assertEqual(self.office.mpan_key, "120001234567A")
+
+    def test_mpan_key_backfill_matches_save(self):
+        migration = importlib.import_module("contracts.migrations.0046_contract_mpan_key")
+        self.office.mpan_mpr = "\u00a012 0001\u2003 2345 67a\x1c"
+        self.office.save()
+        expected = self.office.mpan_key
+        Contract.objects.update(mpan_key="")
+        with mock.patch.object(migration, "BACKFILL_BATCH_SIZE", 1):
+            with connection.schema_editor() as schema_editor:
+                migration.backfill_mpan_keys(apps, schema_editor)
+        self.office.refresh_from_db()
+        self.warehouse.refresh_from_db()
+        self.assertEqual(self.office.mpan_key, expected)
+        self.assertEqual(self.warehouse.mpan_key, "1900098765432")
+        self.assertEqual(
+            set(self.office.history.values_list("mpan_key", flat=True)),
+            {
+                normalise_mpan(mpan)
+                for mpan in self.office.history.values_list("mpan_mpr", flat=True)
+            },
+        )
+
+    def test_mpan_lists(self):
+        both = {self.office, self.warehouse}
+        self.assertEqual(self.search("1200012345678, 1900098765432"), both)
+        self.assertEqual(self.search("1200012345678\r\n1900098765432\r\n"), both)
+        self.assertEqual(self.search("1200012345678 1900098765432"), both)
+        self.assertEqual(self.search("12 0001 2345 678;"), {self.office})
+        self.assertEqual(self.search("1200012345678,0000000000000"), {self.office})
+        self.assertEqual(self.search(" , "), both)
+
+    def test_long_mpan_lists_use_an_array(self):
+        with mock.patch("contracts.custom_search.MPAN_ARRAY_THRESHOLD", 1):
+            self.assertEqual(
+                self.search("1200012345678, 1900098765432"), {self.office, self.warehouse}
+            )
+
+    def test_many_related_matches_use_a_subquery(self):
+        with mock.patch("contracts.custom_search.RELATED_IDS_LIMIT", 0):
+            self.assertEqual(self.search("holdings"), {self.office})
+
+    def test_only_search_fields_are_searched(self):
+        self.model_admin = CustomSearchAdmin(Contract, site)
+        self.model_admin.search_fields = ("business_name", "mpan_mpr")
+        self.assertEqual(self.search("head off"), {self.office})
+        self.assertEqual(self.search("london"), set())
+        self.assertEqual(self.search("holdings"), set())
+        self.assertEqual(self.search("1200012"), {self.office})
+        self.assertEqual(self.search("e10bg"), set())
+
+        self.model_admin.search_fields = ("^client__account_manager__email", "=client_group")
+        self.assertEqual(self.search("manager1"), {self.office, self.warehouse})
+        self.assertEqual(self.search("logistics group"), set())
+        self.assertEqual(self.search('"logistics group"'), {self.warehouse})
+
+
+class AccountManagerFilterTestCase(TestCase):
+    def setUp(self):
+        self.manager1 = AccountManager.objects.create(
+            email="manager1@example.com", role="ACCOUNT_MANAGER"
+        )
+        self.manager2 = AccountManager.objects.create(
+            email="manager2@example.com", role="ACCOUNT_MANAGER"
+        )
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        utility = Utility.objects.create(utility="Utility1")
+        self.contracts = {}
+        for manager in (self.manager1, self.manager2):
+            client = Client.objects.create(client=manager.email, account_manager=manager)
+            self.contracts[manager] = Contract.objects.create(
+                client=client,
+                supplier=supplier,
+                utility=utility,
+                mpan_mpr=str(manager.pk),
+                business_name=manager.email,
+            )
+
+    def filter(self, value=None):
+        params = {"account_manager": value} if value else {}
+        request = RequestFactory().get("/", params)
+        return AccountManagerFilter(request, dict(params), Contract, site._registry[Contract])
+
+    def test_lookups_follow_user_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.filter().lookup_choices,
+                [
+                    (self.manager1.pk, "manager1@example.com"),
+                    (self.manager2.pk, "manager2@example.com"),
+                ],
+            )
+        self.manager1.email = "manager3@example.com"
+        self.manager1.save()
+        self.manager2.delete()
+        self.assertEqual(self.filter().lookup_choices, [(self.manager1.pk, "manager3@example.com")])
+
+    def test_filter_by_id(self):
+        contract_filter = self.filter(str(self.manager2.pk))
+        queryset = contract_filter.queryset(None, Contract.objects.all())
+        self.assertNotIn('"users"', str(queryset.query).lower())
+        self.assertEqual(list(queryset), [self.contracts[self.manager2]])
+
+    def test_filter_by_legacy_email(self):
+        contract_filter = self.filter("manager1@example.com")
+        queryset = contract_filter.queryset(None, Contract.objects.all())
+        self.assertEqual(list(queryset), [self.contracts[self.manager1]])
+        unknown = self.filter("nobody@example.com")
+        self.assertFalse(unknown.queryset(None, Contract.objects.all()).exists())
+
+    def test_filter_by_legacy_email_after_a_rename(self):
+        self.manager1.email = "manager3@example.com"
+        self.manager1.save()
+        self.manager2.email = "manager1@example.com"
+        self.manager2.save()
+        contract_filter = self.filter("manager1@example.com")
+        queryset = contract_filter.queryset(None, Contract.objects.all())
+        self.assertEqual(list(queryset), [self.contracts[self.manager2]])
+
+
+class ContractValidationLevelTestCase(TestCase):
+    def setUp(self):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        client = Client.objects.create(client="Client1", account_manager=account_manager)
+        self.contract = Contract.objects.create(
+            client=client,
+            supplier=Supplier.objects.create(supplier="Supplier1"),
+            utility=Utility.objects.create(utility="Utility1"),
+            future_supplier=Supplier.objects.create(supplier="Supplier2"),
+            mpan_mpr="1234567890123",
+            business_name="Site 1",
+        )
+
+    def count_save_queries(self, validation):
+        contract = Contract.objects.get(pk=self.contract.pk)
+        contract.business_name = f"Saved with {validation}"
+        with CaptureQueriesContext(connection) as queries:
+            contract.save(validation=validation)
+        return len(queries)
+
+    def test_queries_per_save(self):
+        counts = {level: self.count_save_queries(level) for level in Contract.Validation}
+        # Full validation checks the four foreign keys and the unique constraint.
+        self.assertEqual(
+            counts[Contract.Validation.FULL] - counts[Contract.Validation.LIGHT], 5, counts
+        )
+        self.assertEqual(counts[Contract.Validation.LIGHT], counts[Contract.Validation.NONE])
+
+    def test_light_validation_checks_field_values(self):
+        self.contract.contract_status = "UNKNOWN"
+        with self.assertRaises(ValidationError):
+            self.contract.save(validation=Contract.Validation.LIGHT)
+        self.contract.save(validation=Contract.Validation.NONE)
+
+    def test_business_rules_run_at_every_level(self):
+        self.contract.vat_declaration_sent = "YES"
+        with self.assertRaises(ValidationError):
+            self.contract.save(validation=Contract.Validation.NONE)
+
+        self.contract.vat_declaration_sent = "NO"
+        self.contract.mpan_mpr = "12 3456"
+        self.contract.save(validation=Contract.Validation.NONE)
+        self.assertEqual(self.contract.mpan_key, "123456")
+
+    def test_default_level_per_instance(self):
+        self.contract.save_validation = Contract.Validation.LIGHT
+        self.contract.contract_status = "LIVE"
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.save()
+        self.assertEqual(len(queries), self.count_save_queries(Contract.Validation.LIGHT))
+        with self.assertRaises(ValueError):
+            self.contract.save(validation="partial")
+
+
+class ContractResourceTestCase(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.client = Client.objects.create(client="Client1", account_manager=self.account_manager)
+        self.supplier = Supplier.objects.create(supplier="Supplier1")
+        self.utility = Utility.objects.create(utility="Gas")
+        self.contract = Contract.objects.create(
+            client=self.client,
+            supplier=self.supplier,
+            utility=self.utility,
+            mpan_mpr="1234567890123",
+            business_name="Site 1",
+        )
+        GasCommission.objects.create(
+            client=self.client,
+            eac_from=Decimal("0"),
+            eac_to=Decimal("5000"),
+            commission_per_annum=Decimal("120.00"),
+            commission_per_unit=Decimal("0.005"),
+        )
+        rebuild_contract_stats([self.account_manager.pk])
+
+    def dataset(self, new_rows, supplier="Supplier1"):
+        headers = [
+            "id",
+            "client",
+            "supplier",
+            "utility",
+            "business_name",
+            "mpan_mpr",
+            "eac",
+            "is_directors_approval",
+        ]
+        rows = [[self.contract.pk, "Client1", "Supplier1", "Gas", "Site 1", "99 8877", 1000, "YES"]]
+        rows += [
+            [
+                self.contract.pk + index,
+                "Client1",
+                supplier,
+                "Gas",
+                f"Site {index}",
+                str(index),
+                2000,
+                "NO",
+            ]
+            for index in range(1, new_rows + 1)
+        ]
+        return tablib.Dataset(*rows, headers=headers)
+
+    def import_queries(self, new_rows):
+        with CaptureQueriesContext(connection) as queries:
+            result = ContractResource().import_data(self.dataset(new_rows), dry_run=True)
+        self.assertFalse(result.has_errors())
+        self.assertFalse(result.has_validation_errors())
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.assertEqual(self.import_queries(1), self.import_queries(10))
+
+    def test_import_applies_business_rules(self):
+        result = ContractResource().import_data(self.dataset(2), dry_run=False)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals["new"], 2)
+        self.assertEqual(result.totals["update"], 1)
+
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.mpan_key, "998877")
+        self.assertEqual(self.contract.commission_per_unit, Decimal("0.005"))
+        self.assertIsNotNone(self.contract.directors_approval_date)
+        self.assertEqual(self.contract.history.count(), 2)
+
+        created = Contract.objects.get(pk=self.contract.pk + 1)
+        self.assertEqual(created.commission_per_annum, Decimal("120.00"))
+        self.assertIsNone(created.directors_approval_date)
+        self.assertEqual(created.history.count(), 1)
+        self.assertEqual(
+            ContractStatistics.objects.get(pk=self.account_manager.pk).counts,
+            compute_contract_counts(self.account_manager.pk),
+        )
+
+    def test_confirmation_replays_the_dry_run(self):
+        dataset = self.dataset(2)
+        ContractResource().import_data(dataset, dry_run=True)
+        with mock.patch.object(CachedForeignKeyWidget, "clean") as clean:
+            result = ContractResource().import_data(dataset, dry_run=False)
+        clean.assert_not_called()
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals["new"], 2)
+        self.assertEqual(result.totals["update"], 1)
+
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.mpan_key, "998877")
+        self.assertIsNotNone(self.contract.directors_approval_date)
+        created = Contract.objects.get(pk=self.contract.pk + 2)
+        self.assertEqual(created.commission_per_annum, Decimal("120.00"))
+        self.assertEqual(created.history.count(), 1)
+        self.assertEqual(
+            ContractStatistics.objects.get(pk=self.account_manager.pk).counts,
+            compute_contract_counts(self.account_manager.pk),
+        )
+
+    def test_unknown_related_name_fails_its_row(self):
+        result = ContractResource().import_data(self.dataset(1, supplier="Missing"), dry_run=True)
+        self.assertTrue(result.has_errors())
+        self.assertIn("Missing", str(result.rows[1].errors[0].error))
+        self.assertFalse(result.rows[0].errors)
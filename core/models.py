@@ -19,3 +19,94 @@ class UUIDModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class FieldTrackerMixin(models.Model):
+    """
+    Remembers the stored values of tracked_fields so changes can be detected in memory.
+
+    The values are captured when an instance is loaded from the database and again
+    after each save, which lets signal handlers and admin hooks compare old and new
+    values without fetching the row. Instances built in memory with a primary key have
+    no such snapshot and fall back to loading the stored row.
+    """
+
+    tracked_fields = ()
+    _loaded_values = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+
+    def _tracked_attnames(self):
+        return [self._meta.get_field(name).attname for name in self.tracked_fields]
+
+    def _tracked_values(self, attnames=None):
+        # Deferred fields are left out rather than loaded.
+        deferred = self.get_deferred_fields()
+        return {
+            attname: getattr(self, attname)
+            for attname in (self._tracked_attnames() if attnames is None else attnames)
+            if attname not in deferred
+        }
+
+    def get_loaded_values(self):
+        """
+        Returns the stored values of the tracked fields, keyed by attname.
+
+        Raises DoesNotExist when the instance has a primary key but no stored row.
+        """
+        attnames = self._tracked_attnames()
+        if self._loaded_values is None or not set(attnames) <= set(self._loaded_values):
+            self._loaded_values = (
+                type(self)._base_manager.filter(pk=self.pk).values(*attnames).get()
+            )
+        return self._loaded_values
+
+    def previous_value(self, field_name):
+        """Returns the stored value of a tracked field."""
+        return self.get_loaded_values()[self._meta.get_field(field_name).attname]
+
+    def has_changed(self, field_name):
+        """Returns whether a tracked field differs from its stored value."""
+        attname = self._meta.get_field(field_name).attname
+        return self.get_loaded_values()[attname] != getattr(self, attname)
+
+    def save_base(self, *args, update_fields=None, **kwargs):
+        super().save_base(*args, update_fields=update_fields, **kwargs)
+        if update_fields is None:
+            self._loaded_values = self._tracked_values()
+        elif self._loaded_values is not None:
+            written = {self._meta.get_field(name).attname for name in update_fields}
+            self._loaded_values.update(
+                self._tracked_values([name for name in self._tracked_attnames() if name in written])
+            )
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self._loaded_values = self._tracked_values()
+        elif self._loaded_values is not None:
+            refreshed = {self._meta.get_field(name).attname for name in fields}
+            self._loaded_values.update(
+                self._tracked_values(
+                    [name for name in self._tracked_attnames() if name in refreshed]
+                )
+            )
+
+
+class StoredDryRun(TimeStampedModel):
+    """
+    The rows an import dry run validated, kept for the confirmation of the same file.
+
+    Stored in the database rather than the cache so that every worker process sees
+    them. See core.resources.StoredDryRunMixin.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    rows = models.BinaryField()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Paginator
+from django.db import OperationalError, connections, transaction
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# Tables estimated to hold fewer rows than this are counted exactly.
+ESTIMATE_THRESHOLD = 10000
+# Longest an exact count of a filtered changelist may run before the planner's estimate
+# is used instead.
+COUNT_TIMEOUT_MS = 500
+# Seconds a count is reused for the same query, so paging through a filtered
+# changelist counts it once.
+COUNT_CACHE_TIMEOUT = 60
+# Pages starting this deep are read with a deferred join: the ids of the page are found
+# first, which only walks the ordering index, and the full rows are then fetched by id.
+DEFERRED_JOIN_OFFSET = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large tables that avoids a COUNT(*) on every page.
+
+    Unfiltered lists of big tables take the row estimate Postgres keeps for the table.
+    Filtered lists are counted exactly under a statement timeout, falling back to the
+    planner's estimate for filters too expensive to count, and every count is cached for
+    a short while. When the count is an estimate, pages past its end can still be opened,
+    so the list can be paged through with "next" until it runs out.
+
+    Deep pages find their ids first and only then load the full rows, so the rows
+    skipped by the OFFSET are never joined or read in full.
+    """
+
+    count_is_estimate = False
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        # An estimated count may fall short of the rows that are really there.
+        if not self.count_is_estimate and top + self.orphans >= self.count:
+            top = self.count
+        queryset = self.object_list
+        if bottom >= DEFERRED_JOIN_OFFSET and isinstance(queryset, QuerySet):
+            ids = list(queryset.values_list("pk", flat=True)[bottom:top])
+            return self._get_page(queryset.filter(pk__in=ids), number, self)
+        return self._get_page(queryset[bottom:top], number, self)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = "paginator:count:" + hashlib.md5(f"{sql}{params!r}".encode()).hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            count, self.count_is_estimate = cached
+            return count
+
+        count = None
+        if not queryset.query.where:
+            estimate = self.table_estimate(queryset)
+            if estimate >= ESTIMATE_THRESHOLD:
+                count, self.count_is_estimate = estimate, True
+        if count is None:
+            try:
+                count = self.exact_count(queryset)
+            except OperationalError:
+                count, self.count_is_estimate = self.plan_estimate(queryset, sql, params), True
+        cache.set(key, (count, self.count_is_estimate), COUNT_CACHE_TIMEOUT)
+        return count
+
+    @staticmethod
+    def table_estimate(queryset):
+        """Returns the row count Postgres last estimated for the queryset's table."""
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # Tables that were never analysed report -1.
+        return int(row[0]) if row and row[0] > 0 else 0
+
+    @staticmethod
+    def exact_count(queryset):
+        """
+        Returns the exact count of the queryset, raising OperationalError when it runs
+        longer than COUNT_TIMEOUT_MS.
+
+        Inside an outer transaction a SET LOCAL would outlive the count, so the timeout
+        the transaction had is put back afterwards.
+        """
+        connection = connections[queryset.db]
+        previous = None
+        if connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW statement_timeout")
+                previous = cursor.fetchone()[0]
+        try:
+            with transaction.atomic(using=queryset.db):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(COUNT_TIMEOUT_MS)}")
+                return queryset.count()
+        finally:
+            # Run once the savepoint is released or rolled back, which a timed out
+            # count leaves aborted.
+            if previous is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+
+    @staticmethod
+    def plan_estimate(queryset, sql, params):
+        """Returns the number of rows the planner expects the queryset's query to return."""
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if self.count_is_estimate and number > 1:
+                return number
+            raise
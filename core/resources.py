@@ -0,0 +1,301 @@
+import functools
+import hashlib
+import pickle
+import traceback
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.functional import cached_property
+from import_export.results import RowResult
+from import_export.widgets import ForeignKeyWidget, Widget
+
+from .models import StoredDryRun
+
+# Marks a value the database has no object for, so it is not looked up again.
+MISSING = object()
+# Seconds the outcome of a dry run is kept for the confirmation of the import.
+DRY_RUN_TIMEOUT = 60 * 60
+# Stored rows whose database state is checked per query when an import is confirmed.
+DRY_RUN_CHECK_BATCH_SIZE = 1000
+# Outcomes of a dry run that can be replayed on confirmation.
+STORED_IMPORT_TYPES = (
+    RowResult.IMPORT_TYPE_NEW,
+    RowResult.IMPORT_TYPE_UPDATE,
+    RowResult.IMPORT_TYPE_SKIP,
+)
+
+
+def row_hash(values):
+    """Returns a digest of a sequence of values, identifying a row of a file or table."""
+    return hashlib.sha256(repr(tuple(values)).encode()).hexdigest()
+
+
+class CachedForeignKeyWidget(ForeignKeyWidget):
+    """
+    ForeignKeyWidget that looks related objects up in batches and remembers them.
+
+    Values queued with prefetch() are fetched with one IN query per batch_size values,
+    the first time one of them is needed, and every value seen is cached by the lookup
+    field, including values that do not exist, so a name repeated down a column is
+    looked up once. The cache keeps the max_size most recently used values, which
+    bounds its memory on very large tables.
+
+    The lookup field must be unique, and get_queryset() is called without a value or
+    row, so lookups cannot depend on the rest of the row.
+    """
+
+    def __init__(self, model, field="pk", max_size=10000, batch_size=1000, **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.max_size = max_size
+        self.batch_size = min(batch_size, max_size)
+        self.cache = OrderedDict()
+        self.queue = OrderedDict()
+
+    @cached_property
+    def lookup_field(self):
+        if self.field == "pk":
+            return self.model._meta.pk
+        return self.model._meta.get_field(self.field)
+
+    def prefetch(self, values):
+        """Queue the values of a column to be fetched with the first of them."""
+        for value in values:
+            value = Widget.clean(self, value)
+            if value:
+                key = self.lookup_field.to_python(value)
+                if key not in self.cache:
+                    self.queue[key] = None
+
+    def clean(self, value, row=None, **kwargs):
+        if self.use_natural_foreign_keys:
+            return super().clean(value, row, **kwargs)
+        value = Widget.clean(self, value)
+        if not value:
+            return None
+        key = self.lookup_field.to_python(value)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+        else:
+            self.fetch(key)
+        instance = self.cache[key]
+        if instance is MISSING:
+            raise self.model.DoesNotExist(
+                f"{self.model._meta.object_name} matching {self.field}={value!r} does not exist."
+            )
+        return instance
+
+    def fetch(self, key):
+        """Look up a value along with the next batch of queued values."""
+        self.queue.pop(key, None)
+        keys = [key]
+        while self.queue and len(keys) < self.batch_size:
+            keys.append(self.queue.popitem(last=False)[0])
+        found = self.get_queryset(None, None).in_bulk(keys, field_name=self.field)
+        for fetched in keys:
+            self.cache[fetched] = found.get(fetched, MISSING)
+            self.cache.move_to_end(fetched)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+
+class CachedForeignKeyMixin:
+    """
+    Import-export resource mixin resolving foreign keys with CachedForeignKeyWidget.
+
+    The foreign keys the resource generates from the model get the cached widget, and
+    before an import the column of every cached widget is queued for batched lookups.
+    """
+
+    @classmethod
+    def get_fk_widget(cls, field):
+        widget = super().get_fk_widget(field)
+        if widget.keywords.get("use_natural_foreign_keys"):
+            return widget
+        return functools.partial(CachedForeignKeyWidget, model=widget.keywords["model"])
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        for field in self.get_import_fields():
+            if (
+                isinstance(field.widget, CachedForeignKeyWidget)
+                and field.column_name in dataset.headers
+            ):
+                field.widget.prefetch(dataset[field.column_name])
+
+
+class StoredDryRunMixin:
+    """
+    Import-export resource mixin keeping the outcome of a dry run for its confirmation.
+
+    The admin imports a file twice, a dry run for the preview and the real import once
+    it is confirmed. During the dry run every row is hashed and the values it would
+    save are stored in a StoredDryRun, along with a hash of the database row it would change.
+    Confirming the same file as the same user writes those values as they are: the
+    columns are not cleaned, foreign keys not looked up and rows neither validated nor
+    compared again, and unchanged rows are skipped without loading them. Rows whose
+    database row changed in the meantime, and files without a stored dry run, are
+    imported as usual.
+
+    A stored dry run is deleted when its import is confirmed, and ignored and then
+    purged once it is older than DRY_RUN_TIMEOUT.
+
+    before_save_instance() runs for replayed rows too, with ``replaying`` set, so
+    resources can skip the rules whose results were stored.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.dry_run_key = None
+        self.row_hashes = []
+        self.recorded_rows = {}
+        self.stored_rows = {}
+        self.current_row = None
+        self.replaying = False
+
+    def get_dry_run_key(self, dataset, user=None):
+        digest = hashlib.sha256(repr(dataset.headers).encode())
+        for value in self.row_hashes:
+            digest.update(value.encode())
+        resource = f"{type(self).__module__}.{type(self).__qualname__}"
+        return f"imports:dry_run:{resource}:{getattr(user, 'pk', None)}:{digest.hexdigest()}"
+
+    def get_state(self, instance):
+        """Returns the hash of the stored values of an instance."""
+        return row_hash(
+            field.value_from_object(instance) for field in self._meta.model._meta.concrete_fields
+        )
+
+    def load_dry_run(self):
+        """Returns the rows stored by the dry run of the file, if it has not expired."""
+        cutoff = timezone.now() - timedelta(seconds=DRY_RUN_TIMEOUT)
+        stored = StoredDryRun.objects.filter(key=self.dry_run_key, updated_at__gte=cutoff).first()
+        return pickle.loads(stored.rows) if stored else {}
+
+    def store_dry_run(self):
+        """Store the recorded rows of a dry run, purging the expired dry runs of any file."""
+        cutoff = timezone.now() - timedelta(seconds=DRY_RUN_TIMEOUT)
+        StoredDryRun.objects.filter(updated_at__lt=cutoff).delete()
+        StoredDryRun.objects.update_or_create(
+            key=self.dry_run_key, defaults={"rows": pickle.dumps(self.recorded_rows)}
+        )
+
+    def load_stored_rows(self, stored):
+        """Returns the stored rows of a dry run whose database rows are still as they were."""
+        model = self._meta.model
+        fields = model._meta.concrete_fields
+        pk_index = fields.index(model._meta.pk)
+        pks = [entry["pk"] for entry in stored.values() if entry["pk"] is not None]
+        current = {}
+        for start in range(0, len(pks), DRY_RUN_CHECK_BATCH_SIZE):
+            rows = model._base_manager.filter(
+                pk__in=pks[start : start + DRY_RUN_CHECK_BATCH_SIZE]
+            ).values_list(*[field.attname for field in fields])
+            for values in rows:
+                current[values[pk_index]] = row_hash(values)
+        return {
+            number: entry
+            for number, entry in stored.items()
+            if number <= len(self.row_hashes)
+            and entry["hash"] == self.row_hashes[number - 1]
+            and current.get(entry["pk"]) == entry["state"]
+        }
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        self.row_hashes = [row_hash(row) for row in dataset]
+        self.dry_run_key = self.get_dry_run_key(dataset, kwargs.get("user"))
+        if not dry_run:
+            self.stored_rows = self.load_stored_rows(self.load_dry_run())
+
+    def import_row(
+        self,
+        row,
+        instance_loader,
+        using_transactions=True,
+        dry_run=False,
+        raise_errors=None,
+        **kwargs,
+    ):
+        number = kwargs.get("row_number")
+        if number in self.stored_rows:
+            return self.import_stored_row(
+                row, self.stored_rows[number], using_transactions, dry_run, **kwargs
+            )
+
+        self.current_row = {"pk": None, "state": None, "values": None}
+        row_result = super().import_row(
+            row, instance_loader, using_transactions, dry_run, raise_errors, **kwargs
+        )
+        if (
+            dry_run
+            and number is not None
+            and row_result.import_type in STORED_IMPORT_TYPES
+            and (self.current_row["values"] or row_result.import_type == RowResult.IMPORT_TYPE_SKIP)
+        ):
+            self.recorded_rows[number] = dict(
+                self.current_row,
+                hash=self.row_hashes[number - 1],
+                import_type=row_result.import_type,
+                repr=row_result.object_repr,
+            )
+        self.current_row = None
+        return row_result
+
+    def after_import_instance(self, instance, new, row_number=None, **kwargs):
+        super().after_import_instance(instance, new, row_number=row_number, **kwargs)
+        if self.current_row is not None and not new:
+            self.current_row.update(pk=instance.pk, state=self.get_state(instance))
+
+    def before_save_instance(self, instance, using_transactions, dry_run):
+        super().before_save_instance(instance, using_transactions, dry_run)
+        if dry_run and self.current_row is not None:
+            values = {
+                field.attname: field.value_from_object(instance)
+                for field in self._meta.model._meta.concrete_fields
+            }
+            self.current_row["values"] = values
+            if self.current_row["pk"] is None:
+                # New rows keep the id given in the file, which must still be free.
+                self.current_row["pk"] = instance.pk
+
+    def import_stored_row(self, row, entry, using_transactions, dry_run, **kwargs):
+        """Write the values a dry run validated for a row, without cleaning the row again."""
+        row_result = self.get_row_result_class()()
+        row_result.import_type = entry["import_type"]
+        row_result.object_id = entry["pk"]
+        row_result.object_repr = entry["repr"]
+        if entry["import_type"] == RowResult.IMPORT_TYPE_SKIP:
+            return row_result
+
+        new = entry["import_type"] == RowResult.IMPORT_TYPE_NEW
+        row_result.new_record = new
+        instance = self._meta.model(**entry["values"])
+        instance._state.adding = new
+        self.replaying = True
+        try:
+            self.save_instance(instance, new, using_transactions, dry_run)
+            row_result.object_id = instance.pk
+            self.after_import_row(row, row_result, **kwargs)
+        except ValidationError as e:
+            row_result.import_type = RowResult.IMPORT_TYPE_INVALID
+            row_result.validation_error = e
+        except Exception as e:
+            row_result.import_type = RowResult.IMPORT_TYPE_ERROR
+            row_result.errors.append(self.get_error_result_class()(e, traceback.format_exc(), row))
+        finally:
+            self.replaying = False
+        return row_result
+
+    def import_data(self, dataset, dry_run=False, *args, **kwargs):
+        result = super().import_data(dataset, dry_run, *args, **kwargs)
+        # Stored once the import returns, as the dry run's own writes are rolled back.
+        if dry_run and not result.has_errors() and not result.has_validation_errors():
+            self.store_dry_run()
+        return result
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+        if not dry_run:
+            StoredDryRun.objects.filter(key=self.dry_run_key).delete()
@@ -1,6 +1,14 @@
-from django.test import TestCase
+from datetime import date
 
-from core.views import HTMLTitleMixin
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from clients.models import Client
+from contracts.models import Contract
+from core.views import HTMLTitleMixin, KeysetPaginationMixin
+from users.models import AccountManager
+from utilities.models import Supplier, Utility
 
 
 class HTMLTitleMixinTest(TestCase):
@@ -26,3 +34,93 @@ class HTMLTitleMixinTest(TestCase):
         mixin_instance.html_title_required = True
         with self.assertRaises(ValueError):
             mixin_instance.generate_html_title()
+
+
+class KeysetPaginationMixinTest(TestCase):
+    def setUp(self):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        client = Client.objects.create(client="Client1", account_manager=account_manager)
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        utility = Utility.objects.create(utility="Utility1")
+        end_dates = [date(2025, 1, 1), None, date(2024, 1, 1), date(2025, 1, 1), None]
+        for index, end_date in enumerate(end_dates):
+            Contract.objects.create(
+                client=client,
+                supplier=supplier,
+                utility=utility,
+                mpan_mpr=str(index),
+                business_name=f"Site {index}",
+                contract_end_date=end_date,
+            )
+        self.expected = list(
+            Contract.objects.order_by("contract_end_date", "id").values_list("pk", flat=True)
+        )
+
+    def get_page(self, **params):
+        mixin = KeysetPaginationMixin()
+        mixin.request = RequestFactory().get("/", params)
+        return mixin.paginate_keyset(Contract.objects.all(), page_size=2)
+
+    def test_pages_forwards_and_backwards(self):
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(after=pages[-1].next_cursor))
+        self.assertEqual([contract.pk for page in pages for contract in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        previous = self.get_page(before=pages[-1].previous_cursor)
+        self.assertEqual([contract.pk for contract in previous], self.expected[2:4])
+        first = self.get_page(before=previous.previous_cursor)
+        self.assertEqual([contract.pk for contract in first], self.expected[:2])
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(Http404):
+            self.get_page(after="not-a-date~1")
+
+
+class KeysetPaginationPlanTest(TestCase):
+    """Seeking a page must be a range scan of the (contract_end_date, id) index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        account_manager = AccountManager.objects.create(email="manager1@example.com")
+        client = Client.objects.create(client="Client1", account_manager=account_manager)
+        supplier = Supplier.objects.create(supplier="Supplier1")
+        utility = Utility.objects.create(utility="Utility1")
+        Contract.objects.bulk_create(
+            Contract(
+                client=client,
+                supplier=supplier,
+                utility=utility,
+                mpan_mpr=str(index),
+                business_name=f"Site {index}",
+                contract_end_date=date(2025, 1, 1 + index % 28),
+            )
+            for index in range(1000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Contract._meta.db_table}")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertSeeksIndex(self, condition, descending=False):
+        mixin = KeysetPaginationMixin()
+        plan = (
+            Contract.objects.filter(condition)
+            .order_by(*mixin.get_keyset_ordering(descending=descending))[:101]
+            .explain()
+        )
+        self.assertIn("contract_end_date_id_idx", plan)
+        self.assertIn("Index Cond: (ROW(contract_end_date, id)", plan)
+
+    def test_seek_after(self):
+        segments = KeysetPaginationMixin().seek_after(date(2025, 1, 10), 500)
+        self.assertSeeksIndex(segments[0])
+
+    def test_seek_before(self):
+        segments = KeysetPaginationMixin().seek_before(date(2025, 1, 10), 500)
+        self.assertSeeksIndex(segments[0], descending=True)
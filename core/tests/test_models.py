@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from clients.models import Client
+from users.models import AccountManager
+
+
+class FieldTrackerMixinTest(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        Client.objects.create(client="Client1", account_manager=self.account_manager)
+
+    def test_changes_are_detected_in_memory(self):
+        client = Client.objects.get(client="Client1")
+        with self.assertNumQueries(0):
+            self.assertFalse(client.has_changed("is_lost"))
+            client.is_lost = True
+            self.assertTrue(client.has_changed("is_lost"))
+            self.assertFalse(client.previous_value("is_lost"))
+            self.assertEqual(client.previous_value("account_manager"), self.account_manager.pk)
+
+    def test_snapshot_follows_saves(self):
+        client = Client.objects.get(client="Client1")
+        client.is_lost = True
+        client.save()
+        self.assertFalse(client.has_changed("is_lost"))
+        self.assertTrue(client.previous_value("is_lost"))
+
+        client.is_lost = False
+        client.save(update_fields=["is_lost", "client_lost_date"])
+        self.assertFalse(client.previous_value("is_lost"))
+
+    def test_in_memory_instances_load_the_stored_row(self):
+        stored = Client.objects.get(client="Client1")
+        client = Client(pk=stored.pk, client="Client1", account_manager=self.account_manager)
+        client.is_lost = True
+        with self.assertNumQueries(1):
+            self.assertTrue(client.has_changed("is_lost"))
+            self.assertTrue(client.has_changed("is_lost"))
+        with self.assertRaises(Client.DoesNotExist):
+            Client(pk=stored.pk + 1).previous_value("is_lost")
+
+    def test_deferred_fields_are_loaded_when_asked(self):
+        client = Client.objects.only("client").get(client="Client1")
+        self.assertFalse(client.previous_value("is_lost"))
+
+    def test_save_does_not_reload_the_row(self):
+        client = Client.objects.get(client="Client1")
+        client.is_lost = True
+        with CaptureQueriesContext(connection) as queries:
+            client.save()
+        table = Client._meta.db_table
+        selects = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT") and f'FROM "{table}"' in query["sql"]
+        ]
+        self.assertEqual(selects, [])
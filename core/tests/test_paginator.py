@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.db import OperationalError, connection
+from django.test import TestCase
+
+from core.paginator import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for index in range(3):
+            User.objects.create(email=f"user{index}@example.com")
+
+    def test_small_tables_are_counted_exactly(self):
+        paginator = EstimatedCountPaginator(User.objects.order_by("id"), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_unfiltered_large_tables_use_the_table_estimate(self):
+        with mock.patch.object(EstimatedCountPaginator, "table_estimate", return_value=50000):
+            paginator = EstimatedCountPaginator(User.objects.order_by("id"), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 50000)
+        self.assertTrue(paginator.count_is_estimate)
+
+    def test_filtered_counts_are_cached(self):
+        queryset = User.objects.filter(email__startswith="user").order_by("id")
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        other = User.objects.filter(email__startswith="user1").order_by("id")
+        self.assertEqual(EstimatedCountPaginator(other, 2).count, 1)
+
+    def test_count_timeout_ends_with_the_count(self):
+        # Tests run inside a transaction, like a changelist under ATOMIC_REQUESTS.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = '7s'")
+        queryset = User.objects.filter(email__startswith="user").order_by("id")
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], "7s")
+
+    def test_timed_out_counts_keep_the_transaction_usable(self):
+        queryset = User.objects.filter(email__startswith="user").order_by("id")
+        with (
+            mock.patch("core.paginator.COUNT_TIMEOUT_MS", 1),
+            mock.patch.object(type(queryset), "count", side_effect=self.sleep),
+        ):
+            with self.assertRaises(OperationalError):
+                EstimatedCountPaginator.exact_count(queryset)
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], "0")
+
+    @staticmethod
+    def sleep():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_sleep(1)")
+
+    def test_expensive_counts_fall_back_to_the_plan_estimate(self):
+        queryset = User.objects.filter(email__startswith="user").order_by("id")
+        with mock.patch.object(
+            EstimatedCountPaginator, "exact_count", side_effect=OperationalError
+        ):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertGreaterEqual(paginator.count, 1)
+        self.assertTrue(paginator.count_is_estimate)
+        # Pages past an estimated end can still be opened.
+        page = paginator.page(paginator.num_pages + 1)
+        self.assertFalse(page.has_next())
+
+    def test_exact_counts_keep_page_validation(self):
+        paginator = EstimatedCountPaginator(User.objects.order_by("id"), 2)
+        with self.assertRaises(EmptyPage):
+            paginator.page(3)
+
+    def test_deep_pages_are_loaded_by_id(self):
+        queryset = User.objects.order_by("email", "id")
+        with mock.patch("core.paginator.DEFERRED_JOIN_OFFSET", 1):
+            page = EstimatedCountPaginator(queryset, 2).page(2)
+            self.assertIn("IN", str(page.object_list.query))
+            self.assertEqual([user.email for user in page], ["user2@example.com"])
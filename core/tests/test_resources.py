@@ -0,0 +1,136 @@
+from datetime import timedelta
+from unittest import mock
+
+import tablib
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from clients.admin import ClientResource, ElectricityCommissionResource
+from core.models import StoredDryRun
+from core.resources import DRY_RUN_TIMEOUT, CachedForeignKeyWidget
+from clients.models import Client
+from users.models import AccountManager
+from utilities.models import Supplier
+
+
+class CachedForeignKeyWidgetTest(TestCase):
+    def setUp(self):
+        self.suppliers = [
+            Supplier.objects.create(supplier=f"Supplier{index}") for index in range(4)
+        ]
+
+    def test_queued_values_are_fetched_together(self):
+        widget = CachedForeignKeyWidget(Supplier, "supplier")
+        names = [supplier.supplier for supplier in self.suppliers]
+        widget.prefetch(names + names + ["", None])
+        with self.assertNumQueries(1):
+            for supplier in self.suppliers * 2:
+                self.assertEqual(widget.clean(supplier.supplier), supplier)
+            self.assertIsNone(widget.clean(""))
+
+    def test_missing_values_are_remembered(self):
+        widget = CachedForeignKeyWidget(Supplier, "supplier")
+        with self.assertNumQueries(1):
+            for _attempt in range(2):
+                with self.assertRaises(Supplier.DoesNotExist):
+                    widget.clean("Unknown")
+
+    def test_values_are_converted_to_the_lookup_field(self):
+        supplier = Supplier.objects.create(supplier="123")
+        widget = CachedForeignKeyWidget(Supplier, "supplier")
+        widget.prefetch(["123"])
+        self.assertEqual(widget.clean(123), supplier)
+        self.assertEqual(CachedForeignKeyWidget(Supplier).clean(str(supplier.pk)), supplier)
+
+    def test_least_recently_used_values_are_evicted(self):
+        widget = CachedForeignKeyWidget(Supplier, "supplier", max_size=2)
+        widget.clean("Supplier0")
+        widget.clean("Supplier1")
+        widget.clean("Supplier0")
+        widget.clean("Supplier2")
+        self.assertEqual(list(widget.cache), ["Supplier0", "Supplier2"])
+        with self.assertNumQueries(1):
+            widget.clean("Supplier1")
+
+
+class CachedForeignKeyMixinTest(TestCase):
+    def test_generated_foreign_keys_are_cached(self):
+        widget = ElectricityCommissionResource().fields["client"].widget
+        self.assertIsInstance(widget, CachedForeignKeyWidget)
+
+    def test_import_looks_each_column_up_once(self):
+        AccountManager.objects.create(email="manager1@example.com")
+        dataset = tablib.Dataset(
+            *[[f"Client{index}", "manager1@example.com"] for index in range(5)],
+            headers=["client", "account_manager"],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            result = ClientResource().import_data(dataset, dry_run=True)
+        self.assertFalse(result.has_errors())
+        user_lookups = [query for query in queries if 'FROM "users_user"' in query["sql"]]
+        self.assertEqual(len(user_lookups), 1, user_lookups)
+
+
+class StoredDryRunMixinTest(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager1@example.com")
+        self.unchanged = Client.objects.create(
+            client="Client0", account_manager=self.account_manager
+        )
+        self.updated = Client.objects.create(
+            client="Client1",
+            account_manager=AccountManager.objects.create(email="manager2@example.com"),
+        )
+        self.dataset = tablib.Dataset(
+            [self.unchanged.pk, "Client0", "manager1@example.com"],
+            [self.updated.pk, "Client1", "manager1@example.com"],
+            ["", "Client2", "manager1@example.com"],
+            headers=["id", "client", "account_manager"],
+        )
+
+    def confirm(self, user=None):
+        clean = mock.patch.object(
+            CachedForeignKeyWidget,
+            "clean",
+            autospec=True,
+            side_effect=CachedForeignKeyWidget.clean,
+        )
+        with clean as mocked_clean:
+            result = ClientResource().import_data(self.dataset, dry_run=False, user=user)
+        self.assertFalse(result.has_errors())
+        self.assertFalse(result.has_validation_errors())
+        self.assertEqual(
+            (result.totals["new"], result.totals["update"], result.totals["skip"]), (1, 1, 1)
+        )
+        self.assertEqual(Client.objects.filter(account_manager=self.account_manager).count(), 3)
+        return mocked_clean.call_count
+
+    def test_confirmation_replays_the_dry_run(self):
+        ClientResource().import_data(self.dataset, dry_run=True, user=self.account_manager)
+        self.assertEqual(StoredDryRun.objects.count(), 1)
+        self.assertEqual(self.confirm(user=self.account_manager), 0)
+        self.assertFalse(StoredDryRun.objects.exists())
+
+    def test_expired_dry_runs_are_imported_again_and_purged(self):
+        ClientResource().import_data(self.dataset, dry_run=True)
+        expired = timezone.now() - timedelta(seconds=DRY_RUN_TIMEOUT + 1)
+        StoredDryRun.objects.update(updated_at=expired)
+        self.assertEqual(self.confirm(), 3)
+
+        ClientResource().import_data(self.dataset, dry_run=True)
+        StoredDryRun.objects.update(updated_at=expired)
+        other = tablib.Dataset(self.dataset[0], headers=self.dataset.headers)
+        ClientResource().import_data(other, dry_run=True)
+        self.assertEqual(StoredDryRun.objects.count(), 1)
+
+    def test_rows_changed_since_the_dry_run_are_imported_again(self):
+        ClientResource().import_data(self.dataset, dry_run=True)
+        Client.objects.filter(pk=self.updated.pk).update(originator="Changed")
+        self.assertEqual(self.confirm(), 1)
+        self.assertEqual(Client.objects.get(pk=self.updated.pk).originator, "Changed")
+
+    def test_dry_runs_are_kept_per_user(self):
+        ClientResource().import_data(self.dataset, dry_run=True, user=self.account_manager)
+        self.assertEqual(self.confirm(), 3)
@@ -1,3 +1,10 @@
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Q, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.http import Http404
+from django.utils.translation import gettext as _
+
+
 class HTMLTitleMixin:
     html_title = ""
     html_title_prefix = ""
@@ -30,3 +37,134 @@ class HTMLTitleMixin:
         context = super().get_context_data(**kwargs)
         context["html_title"] = self.generate_html_title()
         return context
+
+
+class KeysetPage:
+    """A page of rows plus the cursors of the pages either side of it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Paginate by seeking past the last row shown rather than by OFFSET.
+
+    Rows are ordered by keyset_field and then by primary key, and a page is requested
+    with the cursor of the row before it (?after=) or after it (?before=). With an index
+    on (keyset_field, id) every page costs the same as the first. Null values of the
+    keyset field sort last, as they do in the index.
+    """
+
+    keyset_field = "contract_end_date"
+    page_size = 100
+
+    def get_keyset_ordering(self, descending=False):
+        field = F(self.keyset_field)
+        if descending:
+            return field.desc(nulls_first=True), "-pk"
+        return field.asc(nulls_last=True), "pk"
+
+    def get_cursor(self, obj):
+        value = getattr(obj, self.keyset_field)
+        return f"{'' if value is None else value.isoformat()}~{obj.pk}"
+
+    def parse_cursor(self, queryset, cursor):
+        value, _separator, pk = cursor.rpartition("~")
+        try:
+            field = queryset.model._meta.get_field(self.keyset_field)
+            return (field.to_python(value) if value else None), queryset.model._meta.pk.to_python(
+                pk
+            )
+        except ValidationError:
+            raise Http404(_("Invalid page."))
+
+    def get_keyset_row(self, value=None, pk=None):
+        """Returns the (keyset_field, pk) row of the rows, or of a cursor's values."""
+        if pk is None:
+            expressions = F(self.keyset_field), F("pk")
+        else:
+            expressions = Value(value), Value(pk)
+        return Func(*expressions, function="ROW", output_field=Field())
+
+    def seek_after(self, value, pk):
+        """Returns the filters of the segments after a cursor, in reading order."""
+        field = self.keyset_field
+        if value is None:
+            return [Q(**{f"{field}__isnull": True, "pk__gt": pk})]
+        # A row comparison is a single range of the (keyset_field, id) index, which an OR
+        # of the three cases is not. It never matches nulls, so those are a segment of
+        # their own, read once the rows with a value run out.
+        return [
+            GreaterThan(self.get_keyset_row(), self.get_keyset_row(value, pk)),
+            Q(**{f"{field}__isnull": True}),
+        ]
+
+    def seek_before(self, value, pk):
+        """Returns the filters of the segments before a cursor, in reading order."""
+        field = self.keyset_field
+        if value is None:
+            return [
+                Q(**{f"{field}__isnull": True, "pk__lt": pk}),
+                Q(**{f"{field}__isnull": False}),
+            ]
+        return [LessThan(self.get_keyset_row(), self.get_keyset_row(value, pk))]
+
+    def read_segments(self, queryset, segments, limit, descending=False):
+        """Returns the first limit rows of the segments, querying each only when needed."""
+        ordering = self.get_keyset_ordering(descending=descending)
+        rows = []
+        for segment in segments:
+            rows += queryset.filter(segment).order_by(*ordering)[: limit - len(rows)]
+            if len(rows) == limit:
+                break
+        return rows
+
+    def paginate_keyset(self, queryset, page_size=None):
+        """Returns the KeysetPage of the queryset the request asks for."""
+        page_size = page_size or self.page_size
+        after = self.request.GET.get("after")
+        before = self.request.GET.get("before")
+
+        if before:
+            segments = self.seek_before(*self.parse_cursor(queryset, before))
+            rows = self.read_segments(queryset, segments, page_size + 1, descending=True)
+            has_previous, has_next = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            segments = [Q()]
+            if after:
+                segments = self.seek_after(*self.parse_cursor(queryset, after))
+            rows = self.read_segments(queryset, segments, page_size + 1)
+            has_previous, has_next = bool(after), len(rows) > page_size
+            rows = rows[:page_size]
+
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=self.get_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.get_cursor(rows[0]) if has_previous else None,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        # ListView hook, used when paginate_by is set.
+        page = self.paginate_keyset(queryset, page_size)
+        return None, page, page.object_list, page.has_other_pages()
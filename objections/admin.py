@@ -2,31 +2,32 @@ from admin_auto_filters.filters import AutocompleteFilter
 from django.contrib import admin
 from import_export import fields, resources
 from import_export.admin import ImportExportModelAdmin
-from import_export.widgets import ForeignKeyWidget
 
 from clients.models import Client
+from core.paginator import EstimatedCountPaginator
+from core.resources import CachedForeignKeyMixin, CachedForeignKeyWidget, StoredDryRunMixin
 from utilities.models import Supplier
 
 from .models import Objection
 
 
-class ObjectionResource(resources.ModelResource):
+class ObjectionResource(StoredDryRunMixin, CachedForeignKeyMixin, resources.ModelResource):
     client = fields.Field(
         column_name="client",
         attribute="client",
-        widget=ForeignKeyWidget(Client, "client"),
+        widget=CachedForeignKeyWidget(Client, "client"),
     )
 
     new_supplier = fields.Field(
         column_name="new_supplier",
         attribute="new_supplier",
-        widget=ForeignKeyWidget(Supplier, "supplier"),
+        widget=CachedForeignKeyWidget(Supplier, "supplier"),
     )
 
     objecting_supplier = fields.Field(
         column_name="objecting_supplier",
         attribute="objecting_supplier",
-        widget=ForeignKeyWidget(Supplier, "supplier"),
+        widget=CachedForeignKeyWidget(Supplier, "supplier"),
     )
 
     class Meta:
@@ -53,6 +54,7 @@ class NewSupplierFilter(AutocompleteFilter):
 
 class ObjectionAdmin(ImportExportModelAdmin):
     show_full_result_count = False
+    paginator = EstimatedCountPaginator
     resource_class = ObjectionResource
     list_select_related = ("client",)
     list_display = (
@@ -16,6 +16,7 @@ from commissions.models import ElectricityCommission, GasCommission
 from utilities.models import Supplier, Utility
 from contracts.admin_actions import bulk_quote_template
 from core.decorators import admin_changelist_link
+from core.paginator import EstimatedCountPaginator
 from .resources import ClientResource, ContactResource, ContractResource
 from contracts.custom_search import CustomSearchAdmin
 
@@ -92,6 +93,7 @@ account_manager_admin.register(JobTitle, JobTitleAdmin)
 
 class ClientAdmin(ExportActionMixin, admin.ModelAdmin):
     show_full_result_count = False
+    paginator = EstimatedCountPaginator
     inlines = [ContactInline, ElectricityCommissionInline, GasCommissionInline]
     readonly_fields = ["is_lost", "client_lost_date", "contracts_link"]
     resource_class = ClientResource
@@ -122,6 +124,8 @@ account_manager_admin.register(Client, ClientAdmin)
 
 
 class ContractAdmin(ExportActionMixin, CustomSearchAdmin, admin.ModelAdmin):
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     readonly_fields = [field.name for field in Contract._meta.fields if field.name != "notes"]
 
     def has_change_permission(self, request, obj=None):
@@ -1,19 +1,19 @@
 from import_export import fields, resources
-from import_export.widgets import ForeignKeyWidget
 from django.contrib.auth import get_user_model
 from contracts.models import Contract
 from clients.models import Client
+from core.resources import CachedForeignKeyMixin, CachedForeignKeyWidget
 from contacts.models import Contact, JobTitle
 from utilities.models import Supplier, Utility
 
 User = get_user_model()
 
 
-class ClientResource(resources.ModelResource):
+class ClientResource(CachedForeignKeyMixin, resources.ModelResource):
     account_manager = fields.Field(
         column_name="account_manager",
         attribute="account_manager",
-        widget=ForeignKeyWidget(User, "email"),
+        widget=CachedForeignKeyWidget(User, "email"),
     )
 
     class Meta:
@@ -28,17 +28,17 @@ class ClientResource(resources.ModelResource):
         )
 
 
-class ContactResource(resources.ModelResource):
+class ContactResource(CachedForeignKeyMixin, resources.ModelResource):
     Client = fields.Field(
         column_name="client",
         attribute="client",
-        widget=ForeignKeyWidget(Client, "client"),
+        widget=CachedForeignKeyWidget(Client, "client"),
     )
 
     JobTitle = fields.Field(
         column_name="job_title",
         attribute="job_title",
-        widget=ForeignKeyWidget(JobTitle, "title"),
+        widget=CachedForeignKeyWidget(JobTitle, "title"),
     )
 
     class Meta:
@@ -56,19 +56,25 @@ class ContactResource(resources.ModelResource):
         ]
 
 
-class ContractResource(resources.ModelResource):
+class ContractResource(CachedForeignKeyMixin, resources.ModelResource):
     client = fields.Field(
-        column_name="client", attribute="client", widget=ForeignKeyWidget(Client, "client")
+        column_name="client", attribute="client", widget=CachedForeignKeyWidget(Client, "client")
     )
     supplier = fields.Field(
-        column_name="supplier", attribute="supplier", widget=ForeignKeyWidget(Supplier, "supplier")
+        column_name="supplier",
+        attribute="supplier",
+        widget=CachedForeignKeyWidget(Supplier, "supplier"),
     )
     utility = fields.Field(
-        column_name="utility", attribute="utility", widget=ForeignKeyWidget(Utility, "utility")
+        column_name="utility",
+        attribute="utility",
+        widget=CachedForeignKeyWidget(Utility, "utility"),
     )
 
     class Meta:
         model = Contract
+        # Derived from mpan_mpr on save.
+        exclude = ("mpan_key",)
         export_order = (
             "id",
             "contract_type",
@@ -1,80 +1,84 @@
-from datetime import datetime
-
 from django import template
 
-from clients.models import Client
-from contracts.models import Contract
+from contracts.stats import ContractStats
 
 register = template.Library()
 
 
-@register.simple_tag
-def total_contracts(user):
+def get_contract_stats(context, user):
+    """
+    Returns the dashboard counters for a given user, loading them at most once per render.
+
+    The counters are kept in the template's render context, so a page using any number
+    of the tags below only pays for a single ContractStats lookup per user.
+    """
+    key = ("contract_stats", user.pk)
+    stats = context.render_context.get(key)
+    if stats is None:
+        stats = context.render_context[key] = ContractStats.for_user(user)
+    return stats
+
+
+@register.simple_tag(takes_context=True)
+def contract_stats(context, user):
+    """Returns every dashboard counter for a given user, e.g. {% contract_stats user as stats %}."""
+    return get_contract_stats(context, user)
+
+
+@register.simple_tag(takes_context=True)
+def total_contracts(context, user):
     """Returns total number of contracts for a given user."""
-    return Contract.objects.filter(client__account_manager=user).count()
+    return get_contract_stats(context, user).total_contracts
 
 
-@register.simple_tag
-def total_clients(user, is_lost=False):
+@register.simple_tag(takes_context=True)
+def total_clients(context, user, is_lost=False):
     """
     Returns total number of clients for a given user.
     If is_lost is True, it returns the total number of lost clients.
     Otherwise, it returns the total number of active clients.
     """
-    return Client.objects.filter(account_manager=user, is_lost=is_lost).count()
+    stats = get_contract_stats(context, user)
+    return stats.lost_clients if is_lost else stats.active_clients
 
 
-@register.simple_tag
-def contracts_by_type(user, contract_type):
+@register.simple_tag(takes_context=True)
+def contracts_by_type(context, user, contract_type):
     """Returns total number of contracts of a specific type for a given user."""
-    return Contract.objects.filter(
-        client__account_manager=user, contract_type=contract_type
-    ).count()
+    return get_contract_stats(context, user).contracts_by_type(contract_type)
 
 
-@register.simple_tag
-def directors_approval(user, is_directors_approval):
+@register.simple_tag(takes_context=True)
+def directors_approval(context, user, is_directors_approval):
     """Returns total number of contracts requiring director's approval for a given user."""
-    return Contract.objects.filter(
-        client__account_manager=user, is_directors_approval=is_directors_approval
-    ).count()
+    return get_contract_stats(context, user).directors_approval(is_directors_approval)
 
 
-@register.simple_tag
-def out_of_contract(user, is_ooc):
+@register.simple_tag(takes_context=True)
+def out_of_contract(context, user, is_ooc):
     """Returns total number of contracts that are out of contract for a given user."""
-    return Contract.objects.filter(client__account_manager=user, is_ooc=is_ooc).count()
+    return get_contract_stats(context, user).out_of_contract(is_ooc)
 
 
-@register.simple_tag
-def contracts_by_utility(user, utility_type):
+@register.simple_tag(takes_context=True)
+def contracts_by_utility(context, user, utility_type):
     """Returns total number of contracts for a specific utility type for a given user."""
-    return Contract.objects.filter(
-        client__account_manager=user, utility__utility=utility_type
-    ).count()
+    return get_contract_stats(context, user).contracts_by_utility(utility_type)
 
 
-@register.simple_tag
-def contracts_by_supplier(user, supplier_name):
+@register.simple_tag(takes_context=True)
+def contracts_by_supplier(context, user, supplier_name):
     """Returns total number of contracts with a specific supplier for a given user."""
-    return Contract.objects.filter(
-        client__account_manager=user, supplier__supplier=supplier_name
-    ).count()
+    return get_contract_stats(context, user).contracts_by_supplier(supplier_name)
 
 
-@register.simple_tag
-def contracts_by_status(user, contract_status):
-    """Returns total number of contracts with a specific supplier for a given user."""
-    return Contract.objects.filter(
-        client__account_manager=user, contract_status=contract_status
-    ).count()
-
-
-@register.simple_tag
-def expired_contracts(user):
-    """Returns total number of contracts that have expired for a given user."""
-    # Assuming contract_end_date is a DateTimeField
-    end_date = datetime.strptime("01/01/2024", "%d/%m/%Y")
-    return Contract.objects.filter(
-        client__account_manager=user, contract_end_date__lt=end_date
-    ).count()
+@register.simple_tag(takes_context=True)
+def contracts_by_status(context, user, contract_status):
+    """Returns total number of contracts with a specific status for a given user."""
+    return get_contract_stats(context, user).contracts_by_status(contract_status)
+
+
+@register.simple_tag(takes_context=True)
+def expired_contracts(context, user):
+    """Returns total number of contracts that ended before 01/01/2024 for a given user."""
+    return get_contract_stats(context, user).expired_contracts
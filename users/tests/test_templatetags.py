@@ -0,0 +1,89 @@
+from datetime import date
+from decimal import Decimal
+
+from django.template import Context, Template
+from django.test import TestCase
+
+from clients.models import Client
+from contracts.models import Contract
+from users.models import AccountManager
+from utilities.models import Supplier, Utility
+
+DASHBOARD_TEMPLATE = (
+    "{% load client_tags %}"
+    "{% total_clients user %}|{% total_clients user True %}|{% total_contracts user %}|"
+    '{% contracts_by_type user contract_type="SEAMLESS" %}|'
+    '{% contracts_by_utility user utility_type="Gas" %}|'
+    '{% contracts_by_utility user utility_type="Electricity -HH" %}|'
+    '{% contracts_by_status user contract_status="LIVE" %}|'
+    '{% contracts_by_status user contract_status="LOST" %}|'
+    '{% contracts_by_supplier user supplier_name="E.ON Next" %}|'
+    '{% contracts_by_supplier user supplier_name="Corona" %}|'
+    '{% directors_approval user is_directors_approval="YES" %}|'
+    '{% out_of_contract user is_ooc="YES" %}|'
+    "{% expired_contracts user %}"
+)
+
+
+class ClientTagsTestCase(TestCase):
+    def setUp(self):
+        self.account_manager = AccountManager.objects.create(email="manager@example.com")
+        other_manager = AccountManager.objects.create(email="other@example.com")
+        client = Client.objects.create(client="Client1", account_manager=self.account_manager)
+        Client.objects.create(client="Client2", account_manager=self.account_manager, is_lost=True)
+        other_client = Client.objects.create(client="Client3", account_manager=other_manager)
+        eon = Supplier.objects.create(supplier="E.ON Next")
+        gas = Utility.objects.create(utility="Gas")
+        half_hourly = Utility.objects.create(utility="Electricity -HH")
+
+        Contract.objects.create(
+            client=client,
+            supplier=eon,
+            utility=gas,
+            mpan_mpr="1",
+            eac=Decimal("1000.00"),
+            business_name="Site 1",
+            contract_end_date=date(2023, 6, 30),
+            is_ooc="YES",
+        )
+        Contract.objects.create(
+            client=client,
+            supplier=eon,
+            utility=half_hourly,
+            mpan_mpr="2",
+            business_name="Site 2",
+            contract_status="LOST",
+            contract_type="NON_SEAMLESS",
+            is_directors_approval="YES",
+            contract_end_date=date(2025, 6, 30),
+        )
+        Contract.objects.create(
+            client=other_client,
+            supplier=eon,
+            utility=gas,
+            mpan_mpr="3",
+            eac=Decimal("1000.00"),
+            business_name="Site 3",
+        )
+
+    def test_dashboard_counters(self):
+        rendered = Template(DASHBOARD_TEMPLATE).render(Context({"user": self.account_manager}))
+        self.assertEqual(rendered, "1|1|2|1|1|1|1|1|2|0|1|1|1")
+
+    def test_dashboard_counters_share_queries(self):
+        template = Template(DASHBOARD_TEMPLATE)
+        # Statistics row lookup, one conditional aggregation, one utility/supplier
+        # breakdown, one client count and storing the computed row.
+        with self.assertNumQueries(5):
+            template.render(Context({"user": self.account_manager}))
+        # Later renders read the stored row only.
+        with self.assertNumQueries(1):
+            template.render(Context({"user": self.account_manager}))
+
+    def test_contract_stats_assignment_tag(self):
+        template = Template(
+            "{% load client_tags %}{% contract_stats user as stats %}"
+            "{{ stats.total_contracts }}|{{ stats.by_status.LOST }}|{{ stats.by_utility.Gas }}"
+        )
+        rendered = template.render(Context({"user": self.account_manager}))
+        self.assertEqual(rendered, "2|1|1")
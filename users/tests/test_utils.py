@@ -0,0 +1,26 @@
+import pytest
+
+from ..models import AccountManager, ClientManager
+from ..utils import account_manager_choices
+
+
+@pytest.mark.django_db
+def test_account_manager_choices(django_assert_num_queries):
+    manager = AccountManager.objects.create(email="manager1@example.com", role="ACCOUNT_MANAGER")
+    ClientManager.objects.create(email="client1@example.com", role="CLIENT_MANAGER")
+
+    with django_assert_num_queries(1):
+        assert account_manager_choices() == [(manager.pk, "manager1@example.com")]
+
+
+@pytest.mark.django_db
+def test_account_manager_choices_follow_user_changes():
+    manager = AccountManager.objects.create(email="manager1@example.com", role="ACCOUNT_MANAGER")
+    assert account_manager_choices() == [(manager.pk, "manager1@example.com")]
+
+    manager.email = "manager2@example.com"
+    manager.save()
+    assert account_manager_choices() == [(manager.pk, "manager2@example.com")]
+
+    manager.delete()
+    assert account_manager_choices() == []
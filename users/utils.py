@@ -6,6 +6,8 @@ from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from .models import AccountManager
+
 
 def detect_user(user):
     if user.role == "CLIENT_MANAGER":
@@ -36,3 +38,13 @@ def send_verification_email(request, user, mail_subject, email_template):
     mail = EmailMessage(mail_subject, message, from_email, to=[to_email])
     mail.content_subtype = "html"
     mail.send()
+
+
+def account_manager_choices():
+    """
+    Returns the (id, email) pairs of every account manager.
+
+    Read on every call rather than cached, so a manager renamed or deleted in one
+    process is shown as it is by every other.
+    """
+    return list(AccountManager.objects.order_by("email").values_list("id", "email"))
@@ -14,7 +14,7 @@ from django.views.generic import ListView
 
 from contracts.models import Contract
 from core.decorators import client_manager_required
-from core.views import HTMLTitleMixin
+from core.views import HTMLTitleMixin, KeysetPaginationMixin
 
 from .forms import RegistrationForm
 
@@ -245,14 +245,15 @@ def reset_password(request):
 
 
 @method_decorator([never_cache, client_manager_required], name="dispatch")
-class ClientManagerDashBoard(LoginRequiredMixin, HTMLTitleMixin, ListView):
+class ClientManagerDashBoard(LoginRequiredMixin, HTMLTitleMixin, KeysetPaginationMixin, ListView):
     """Returns the Client Manager's Dashboard on login.
-    Lists out all the client's contracts with a link to the detail"""
+    Lists out the client's contracts, a page at a time, with a link to the detail"""
 
     model = Contract
     template_name = "client_managers/client_managers_dashboard.html"
     html_title = "Contracts List"
     login_url = "/users/login/"
+    paginate_by = 100
 
     def get_queryset(self):
         return Contract.objects.filter(client_manager=self.request.user)